@@ -1,9 +1,16 @@
-import nltk
+import collections
 import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-import numpy as np
 from colorama import Fore
 from python_files.disfluency_generation import LARD
+from python_files.encoded_corpus import EncodedCorpus
+from python_files.input_reader import InputReader
+from python_files.line_index import LineIndex
+from python_files.progress import ProgressReporter
+from python_files.shard_writer import ShardWriter
+from python_files.spans import to_span_schema
+from python_files.worker_pool import LARDPool, warm_up
 import random
 from colorama import init
 
@@ -14,6 +21,21 @@ DISFLUENT_PERC = [50, 25, 25]
 REPEAT_PERC = [40, 30, 30]
 REPLACE_PERC = [20, 15, 20, 15, 20, 10]
 
+# Number of rows generated between two progress updates (and written together, when the output is sharded)
+CHUNK_SIZE = 1000
+
+# Names of the output files of each type of disfluencies
+OUTPUT_NAMES = {'fluency': 'fluencies', 'repetition': 'repeat', 'restart': 'restarts', 'replacement': 'replacements'}
+TYPE_NAMES = {'fluency': 'fluencies', 'repetition': 'repetitions', 'restart': 'restarts', 'replacement': 'replacements'}
+
+# Output schemas: the token lists and the annotations of each row, or the offsets of the components of each disfluency
+OUTPUT_SCHEMAS = ['tokens', 'spans']
+
+# (pos, condition) of each type of replacements, in the order of replacement_types_percentage
+REPLACEMENT_TYPES = [('NOUN', 'with_cue'), ('NOUN', 'without_cue'),
+                     ('VERB', 'with_cue'), ('VERB', 'without_cue'),
+                     ('ADJ', 'with_cue'), ('ADJ', 'without_cue')]
+
 lard = LARD()
 
 
@@ -26,7 +48,22 @@ def create_dataset(input_file_path,
                    repetition_degrees_percentage=None,
                    replacement_types_percentage=None,
                    create_all_files=True,
-                   concat_files=True):
+                   concat_files=True,
+                   workers=None,
+                   progress_callback=None,
+                   progress_interval=None,
+                   metrics_format=None,
+                   shard_size=None,
+                   compression='gzip',
+                   encoded=False,
+                   dry_run=False,
+                   dry_run_fraction=0.01,
+                   threads=None,
+                   seed=None,
+                   max_tokens=None,
+                   overflow='skip',
+                   time_budget=None,
+                   output_schema='tokens'):
     """
     This function is used to create multiple disfluencies (repetition, restarts and replacements) from fluent text
     from a .csv file.
@@ -35,11 +72,15 @@ def create_dataset(input_file_path,
             input_file_path (`str`): The path of the input file. The input file must be formatted as
             a .csv file with one or more column and a least one text column that you want to generate
             the disfluencies. To see a sample data file, please refer to the data/sample_data directory.
+            Alternatively, it can be a plain-text .txt file with one utterance per line. A line-offset index
+            is then built next to it (input.txt.idx.npy) and the restarts draw their partner sentences
+            from random lines of the whole file.
 
             output_dir (`int`, *optional*, defaults to 'None'): The directory to store the created files.
             If it is not specified, the data are stored by default to ./data/output_data directory.
 
-            column_text (`str`): The column that contains the fluent text.
+            column_text (`str`): The column that contains the fluent text. For .txt input files, it is the name
+            of the text column of the output files (defaults to 'text').
 
             keep_fluent (`bool`, *optional*, defaults to False): Whether or not to keep some fluencies along
             with the disfluencies. If it is not specified, the default value is set to False.
@@ -84,450 +125,526 @@ def create_dataset(input_file_path,
             concat_files (`bool`, *optional*, defaults to True): Whether or not to concat into a final file all
             the different types of disfluencies. If not specified, the default value is set to True.
 
-    """
+            workers (`int`, *optional*, defaults to 'None'): The number of worker processes to generate the
+            disfluencies with. The NLTK models are loaded once and shared copy-on-write with the workers. If it is
+            not specified, the disfluencies are generated in the current process.
 
-    final_df = pd.DataFrame()
+            progress_callback (`callable`, *optional*, defaults to 'None'): A function that is called with
+            (subtype, processed_rows, kept_rows) after each chunk of rows is processed, e.g.
+            ('repetition_2', 1000, 987). The rows that could not be created are not kept.
 
-    if input_file_path.lower().endswith(".csv"):
-        fluent_data = pd.read_csv(input_file_path)
-        if column_text is None:
-            raise ValueError("You have to specify text column.")
-    else:
-        fluent_data = None
-        print("You have to input a supported format input file. Supported formats: .csv or .json")
+            progress_interval (`float`, *optional*, defaults to 'None'): The interval in seconds to report the
+            processed rows, the rows/sec, the ETA and the yield of each subtype. If it is not specified, the progress
+            is not reported.
 
-    if output_dir is None:
-        output_dir = os.getcwd() + '/data/output_data'
+            metrics_format (`str`, *optional*, defaults to 'None'): Whether to also write the progress to a
+            json (progress.json) or a prometheus (lard_progress.prom) metrics file in output_dir, that is refreshed
+            with the progress. Requires progress_interval.
 
-    if keep_fluent:
-        if percentages is not None:
-            raise ValueError(
-                "You have to specify percentages with fluent instead of percentages, when keep_fluent is set to True.")
+            shard_size (`int`, *optional*, defaults to 'None'): If it is specified, the created disfluencies are
+            written in chunks by a background writer thread while the generation continues, to output shards
+            (e.g. repeat-00000.csv.gz) that are rotated when their size exceeds shard_size bytes. Otherwise, each file
+            is written after all the disfluencies of its type are created.
 
-        if percentages_with_fluent is None:
-            # If not specified from user, set to default percentages
-            print("Percentages were not specified from user.")
-            print("Setting percentages to default values...")
-            print("To change these values, please specify the percentages_with_fluent parameter.\n")
-            percentages = FLUENT_PERC
+            compression (`str`, *optional*, defaults to 'gzip'): The compression of the output shards, gzip or None.
 
-        if percentages_with_fluent is not None:
-            if sum(percentages_with_fluent) != 100:
-                raise ValueError("The sum of percentages must be 100.")
-            if len(percentages_with_fluent) != 4:
-                raise ValueError("A list with length " + str(
-                    len(percentages_with_fluent)) + " is passed. You have to input a list with length 4.")
-            else:
-                print("Setting percentages...\n")
+            encoded (`bool`, *optional*, defaults to False): Whether or not to tokenize the input once into an
+            integer-encoded corpus (a shared vocabulary and int32 token ids) and to create the repetitions, the restarts
+            and the fluencies on the token ids, in the current process. The created disfluencies are the same.
 
-            fluencies = percentages_with_fluent[0]
-            repetitions = percentages_with_fluent[1]
-            restarts = percentages_with_fluent[2]
-            replacements = percentages_with_fluent[3]
+            dry_run (`bool`, *optional*, defaults to False): Whether or not to only estimate the job. A fraction of
+            the input is sampled and the yield, the rows/sec, the output size and the peak memory of the whole job are
+            extrapolated from it (see plan_dataset in planner.py). No output is written.
 
-            print("Fluencies: " + str(fluencies) + "%")
-            print("Repetitions: " + str(repetitions) + "%")
-            print("Restarts: " + str(restarts) + "%")
-            print("Replacements: " + str(replacements) + "%\n")
+            dry_run_fraction (`float`, *optional*, defaults to 0.01): The fraction of the input that is sampled
+            in a dry run.
 
-            first_split = fluencies / 100
-            second_split = first_split + repetitions / 100
-            third_split = second_split + restarts / 100
+            threads (`int`, *optional*, defaults to 'None'): The number of threads to generate the disfluencies with,
+            in the current process. Every row draws from its own random generator, so the created disfluencies are the
+            same with any number of threads (or workers), but differ from the disfluencies of a run without threads,
+            where the rows draw from the generator of the run one after the other. Cannot be combined with workers.
 
-            fluent_set, repetition_set, restart_set, replacement_set = np.split(fluent_data,
-                                                                                [int(first_split * len(fluent_data)),
-                                                                                 int(second_split * len(fluent_data)),
-                                                                                 int(third_split * len(fluent_data))])
+            seed (`int`, *optional*, defaults to 'None'): The seed of the random generator of the run. With the same
+            seed and parameters, the same disfluencies are created. If it is not specified, the random generator is
+            seeded from the operating system.
 
-            fluent_set = create_disfluencies(fluent_set, column_text, 'fluency')
+            max_tokens (`int`, *optional*, defaults to 'None'): The maximum number of tokens of an input row.
+            It is applied by LARD on every path (the LARD methods, the fluencies and the encoded corpus): the
+            whitespace-separated words are counted before tokenization and the tokens after it. If it is not
+            specified, the length of the rows is not limited.
 
-            if create_all_files:
-                fluent_set.to_csv(output_dir + "/fluencies.csv", index=False)
-                print(Fore.GREEN + u'\u2713' + " Saving to individual files completed")
+            overflow (`str`, *optional*, defaults to 'skip'): Whether to skip or to truncate the rows with more than
+            max_tokens tokens.
 
-            if concat_files:
-                final_df = final_df.append(fluent_set, ignore_index=True)
-
-            if repetition_degrees_percentage is None and percentages_with_fluent[1] != 0:
-                print("Repetitions percentages were not specified from user.")
-                print("Setting repetitions percentages to default values...")
-                print("To change these values, please specify the percentages parameter.\n")
-
-                repetition_degrees_percentage = REPEAT_PERC
-
-            if repetition_degrees_percentage is not None and percentages_with_fluent[1] == 0:
-                raise ValueError(
-                    "The percentage of repetitions must be more than 0, when repetition_degrees_percentage is set.")
-
-            if repetition_degrees_percentage is not None and percentages_with_fluent[1] != 0:
-                if sum(repetition_degrees_percentage) != 100:
-                    raise ValueError("The sum of percentages must be 100.")
-                if len(repetition_degrees_percentage) != 3:
-                    raise ValueError(
-                        "A list with length " + str(
-                            len(repetition_degrees_percentage)) + " is passed. You have to input a list with length 3.")
-                else:
-                    print("Setting percentages...\n")
-            if percentages_with_fluent[1] != 0:
-                one_reps = repetition_degrees_percentage[0]
-                two_reps = repetition_degrees_percentage[1]
-                three_reps = repetition_degrees_percentage[2]
+            time_budget (`float`, *optional*, defaults to 'None'): The maximum processing time of a row in seconds,
+            checked by the LARD methods after each stage. The rows that exceed it are skipped.
 
-                print("One-degree repetitions: " + str(one_reps) + "%")
-                print("Second-degree repetitions: " + str(two_reps) + "%")
-                print("Third-degree repetitions: " + str(three_reps) + "%")
+            The skipped and the truncated rows are counted once per input row (the partner sentences of the restarts
+            are not counted), also in the workers, and printed at the end.
 
-                first_split = int(one_reps / 100)
-                second_split = first_split + int(two_reps / 100)
+            output_schema (`str`, *optional*, defaults to 'tokens'): The schema of the output files. With 'tokens',
+            the fluent tokens, the disfluent tokens and the annotations of each row are written. With 'spans', the
+            disfluent sentence is written once with the token and character offsets of its reparandum, interregnum
+            and repair (see spans.py). The token columns can be rebuilt with load_dataset(path, legacy=True).
 
-                one_reps_set, two_reps_set, three_reps_set = np.split(repetition_set,
-                                                                      [int(first_split * len(fluent_data)),
-                                                                       int(second_split * len(
-                                                                           fluent_data))])
+    Returns:
+            plan (`dict`): The estimated plan of the job, when dry_run is set to True
 
-                print("Creating repetitions...")
+    """
 
-                one_reps_set = create_disfluencies(one_reps_set, column_text, 'repetition', degree=1)
-                two_reps_set = create_disfluencies(two_reps_set, column_text, 'repetition', degree=2)
-                three_reps_set = create_disfluencies(three_reps_set, column_text, 'repetition', degree=3)
+    if dry_run:
+        from python_files.planner import plan_dataset
+        return plan_dataset(input_file_path, column_text, keep_fluent, percentages, percentages_with_fluent,
+                            repetition_degrees_percentage, replacement_types_percentage, create_all_files,
+                            concat_files, shard_size, encoded, dry_run_fraction, seed=seed if seed is not None else 0,
+                            max_tokens=max_tokens, overflow=overflow, time_budget=time_budget,
+                            output_schema=output_schema)
 
-                print(Fore.GREEN + u'\u2713' + " Creating repetition completed")
-                repeat_frames = [one_reps_set, two_reps_set, three_reps_set]
-                final_repeats = pd.concat(repeat_frames)
+    fractions = subtype_fractions(keep_fluent, percentages, percentages_with_fluent,
+                                  repetition_degrees_percentage, replacement_types_percentage)
+    print_percentages(fractions)
 
-                if create_all_files:
-                    print("Saving to individual files...")
-                    final_repeats.to_csv(output_dir + "/repeat.csv", index=False)
-                    print(Fore.GREEN + u'\u2713' + " Saving to individual files completed")
+    if output_dir is None:
+        output_dir = os.getcwd() + '/data/output_data'
 
+    if workers is not None and threads is not None:
+        raise ValueError("You have to specify either workers or threads.")
+
+    if output_schema not in OUTPUT_SCHEMAS:
+        raise ValueError("The output schema must be one of: " + ", ".join(OUTPUT_SCHEMAS))
+
+    # Each run has its own LARD instance, with its own random generator
+    generator = LARD(seed=seed, max_tokens=max_tokens, overflow=overflow, time_budget=time_budget)
+
+    if progress_interval is None and metrics_format is not None:
+        raise ValueError("You have to specify progress_interval, when metrics_format is set.")
+
+    # The input is read in chunks by the reader thread, while the previous chunks are generated. The rows are
+    # counted first, to split them into the subtypes
+    reader = InputReader(input_file_path, column_text, CHUNK_SIZE)
+    column_text, line_index = reader.column_text, reader.line_index
+
+    # The reader, the workers, the threads, the progress reporter and the shard writer are stopped also when the
+    # generation fails
+    pool = None
+    executor = None
+    reporter = None
+    writer = None
+    try:
+        n_rows = len(line_index) if line_index is not None else count_rows(input_file_path, column_text)
+
+        if workers is not None:
+            pool = LARDPool(workers, lard=generator)
+            pool.stats()
+
+        if threads is not None:
+            # Load the models once, before the threads use them
+            warm_up(generator)
+            executor = ThreadPoolExecutor(threads)
+
+        if progress_interval is not None:
+            reporter = ProgressReporter(n_rows, progress_interval, output_dir, metrics_format).start()
+
+        def report_progress(subtype, processed_rows, kept_rows):
+            if reporter is not None:
+                reporter.update(subtype, processed_rows, kept_rows)
+            if progress_callback is not None:
+                progress_callback(subtype, processed_rows, kept_rows)
+
+        output = None
+        if shard_size is not None:
+            writer = ShardWriter(output_dir, shard_size, compression).start()
+
+            def output(disfl_type, frame):
+                if output_schema == 'spans':
+                    frame = to_span_schema(frame)
+                if create_all_files:
+                    writer.write(OUTPUT_NAMES[disfl_type], frame)
                 if concat_files:
-                    final_df = final_df.append(final_repeats, ignore_index=True)
+                    writer.write('final_disfluent_set', frame)
+
+        def save_csv(frame, path):
+            # The sharded output is written by the writer thread
+            if writer is None:
+                if output_schema == 'spans':
+                    frame = to_span_schema(frame)
+                frame.to_csv(path, index=False)
+
+        options = {'pool': pool, 'progress_callback': report_progress, 'output': output, 'generator': generator,
+                   'executor': executor}
+        # The rows of each subtype are a contiguous range of the input, in the order of the output files
+        bounds = list(subtype_bounds(n_rows, fractions).items())
+
+        if encoded:
+            # The rows of the corpus are the positions of the input rows. It is encoded in a first pass over the input.
+            # The replacements are created from the texts, which LARD tokenizes (and counts) again
+            replacement_rows = [range(*bound) for subtype, bound in bounds
+                                if fractions[subtype][1]['disfl_type'] == 'replacement']
+            options['corpus'] = encode_input(InputReader(input_file_path, column_text, CHUNK_SIZE,
+                                                         line_index=line_index), generator, replacement_rows)
+
+        # The (position, text) of the last CHUNK_SIZE rows that were read
+        recent_rows = collections.deque(maxlen=CHUNK_SIZE)
+        if line_index is not None:
+            if pool is not None:
+                # The workers read the sentences of their rows from the input
+                options['line_index'] = line_index
+            # The restarts draw their partner sentences from the whole corpus through the line index
+            if encoded:
+                options['partner_sampler'] = options['corpus'].sample_row
+            else:
+                options['partner_sampler'] = lambda: line_index.sample(generator.rng)
+        else:
+            # The restarts draw their partner sentences from the last rows that were read (their rows in the corpus,
+            # when it is encoded)
+            field = 0 if encoded else 1
+            options['partner_sampler'] = lambda: recent_rows[generator.rng.randrange(len(recent_rows))][field]
+
+        created = {disfl_type: [] for disfl_type in OUTPUT_NAMES}
+        creating = None
+        current = 0
+
+        for chunk in reader:
+            recent_rows.extend(zip(chunk.index, chunk[column_text]))
+            # A chunk can span the end of a subtype and the beginning of the next ones
+            chunk_stop = chunk.index[-1] + 1
+
+            while current < len(bounds) and bounds[current][1][0] < chunk_stop:
+                subtype, (start, stop) = bounds[current]
+                kwargs = dict(fractions[subtype][1])
+                disfl_type = kwargs.pop('disfl_type')
+                if disfl_type != creating:
+                    if creating is not None:
+                        print(Fore.GREEN + u'\u2713' + " Creating " + TYPE_NAMES[creating] + " completed")
+                    print("Creating " + TYPE_NAMES[disfl_type] + "...")
+                    creating = disfl_type
+
+                subset = chunk[(chunk.index >= start) & (chunk.index < stop)]
+                if len(subset) != 0:
+                    created[disfl_type].append(create_disfluencies(subset.copy(), column_text, disfl_type,
+                                                                   **kwargs, **options))
+                if stop > chunk_stop:
+                    break
+                current += 1
+
+        if creating is not None:
+            print(Fore.GREEN + u'\u2713' + " Creating " + TYPE_NAMES[creating] + " completed")
+
+        final_frames = []
+        for disfl_type, frames in created.items():
+            if not frames:
+                continue
+            frame = pd.concat(frames)
+            if create_all_files:
+                save_csv(frame, output_dir + "/" + OUTPUT_NAMES[disfl_type] + ".csv")
+            if concat_files:
+                final_frames.append(frame)
+
+        if create_all_files:
+            print(Fore.GREEN + u'\u2713' + " Saving to individual files completed")
+
+        if concat_files:
+            print("Concatenating and saving to file...")
+            save_csv(pd.concat(final_frames, ignore_index=True) if final_frames else pd.DataFrame(),
+                     output_dir + "/final_disfluent_set.csv")
+            print(Fore.GREEN + u'\u2713' + " Saving completed")
+
+        if writer is not None:
+            writer.close()
+            writer = None
+            print(Fore.GREEN + u'\u2713' + " Writing output shards completed")
+
+        if max_tokens is not None or time_budget is not None:
+            guards = generator.guard_stats()
+            print("Rows skipped for max_tokens: " + str(guards['max_tokens']))
+            print("Rows skipped for time_budget: " + str(guards['time_budget']))
+            print("Rows truncated: " + str(guards['truncated']))
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.close()
+        if pool is not None:
+            pool.close()
+        if executor is not None:
+            executor.shutdown()
+        if reporter is not None:
+            reporter.stop()
+
+
+
+def read_fluent_data(input_file_path, column_text):
+    """ Read the input file of create_dataset.
+
+    Returns:
+        fluent_data (`pd.DataFrame`), column_text (`str`), line_index (`LineIndex`): The input rows, the text column
+        and, for .txt input files, the line index of the file
+    """
+    line_index = None
+    if input_file_path.lower().endswith(".csv"):
+        fluent_data = pd.read_csv(input_file_path)
+        if column_text is None:
+            raise ValueError("You have to specify text column.")
+    elif input_file_path.lower().endswith(".txt"):
+        if column_text is None:
+            column_text = 'text'
+        line_index = LineIndex(input_file_path)
+        fluent_data = pd.DataFrame({column_text: list(line_index.lines())})
+    else:
+        fluent_data = None
+        print("You have to input a supported format input file. Supported formats: .csv or .txt")
 
-            if percentages_with_fluent[2] != 0:
-                print("Creating restarts...")
-                restart_set = create_disfluencies(restart_set, column_text, 'restart')
-                print(Fore.GREEN + u'\u2713' + " Creating restarts completed")
+    return fluent_data, column_text, line_index
 
-                if create_all_files:
-                    print("Saving to individual files...")
-                    restart_set.to_csv(output_dir + "/restarts.csv", index=False)
 
-                if concat_files:
-                    final_df = final_df.append(restart_set, ignore_index=True)
-
-            if replacement_types_percentage is None and percentages_with_fluent[3] != 0:
-                print("Replacements percentages were not specified from user.")
-                print("Setting replacements percentages to default values...")
-                print("To change these values, please specify the percentages parameter.\n")
-
-                replacement_types_percentage = REPLACE_PERC
-
-            if replacement_types_percentage is not None and percentages_with_fluent[3] == 0:
-                raise ValueError(
-                    "The percentage of replacements must be more than 0, when replacement_types_percentage is set.")
-
-            if replacement_types_percentage is not None and percentages_with_fluent[3] != 0:
-                if sum(replacement_types_percentage) != 100:
-                    raise ValueError("The sum of percentages must be 100.")
-                if len(replacement_types_percentage) != 6:
-                    raise ValueError(
-                        "A list with length " + str(
-                            len(replacement_types_percentage)) + " is passed. You have to input a list with length 6.")
-                else:
-                    print("Setting percentages...\n")
-
-            if percentages_with_fluent[2] != 0:
-                noun_with_cue = replacement_types_percentage[0]
-                noun_without_cue = replacement_types_percentage[1]
-                verb_with_cue = replacement_types_percentage[2]
-                verb_without_cue = replacement_types_percentage[3]
-                adj_with_cue = replacement_types_percentage[4]
-                adj_without_cue = replacement_types_percentage[5]
-
-                print("Noun replacements with repair cue: " + str(noun_with_cue) + "%")
-                print("Noun replacements without repair cue: " + str(noun_without_cue) + "%")
-                print("Verb replacements with repair cue: " + str(verb_with_cue) + "%")
-                print("Verb replacements without repair cue: " + str(verb_without_cue) + "%")
-                print("Adjective replacements with repair cue: " + str(adj_with_cue) + "%")
-                print("Adjective replacements without repair cue: " + str(adj_without_cue) + "%\n")
-
-                first_split = int(noun_with_cue / 100)
-                second_split = first_split + int(noun_without_cue / 100)
-                third_split = second_split + int(verb_with_cue / 100)
-                fourth_split = third_split + int(verb_without_cue / 100)
-                fifth_split = fourth_split + int(adj_with_cue / 100)
-
-                noun_with_cue_set, noun_without_cue_set, \
-                verb_with_cue_set, verb_without_cue_set, \
-                adj_with_cue_set, adj_without_cue_set = np.split(replacement_set,
-                                                                 [int(first_split * len(fluent_data)),
-                                                                  int(second_split * len(fluent_data)),
-                                                                  int(third_split * len(fluent_data)),
-                                                                  int(fourth_split * len(fluent_data)),
-                                                                  int(fifth_split * len(fluent_data))])
-
-                print("Creating replacements...")
-                print("Warning: This process might take a little longer, especially if you process a large dataset.")
-
-                noun_with_cue_set = create_disfluencies(noun_with_cue_set, column_text, 'replacement', pos='NOUN',
-                                                        condition="with_cue")
-                noun_without_cue_set = create_disfluencies(noun_without_cue_set, column_text, 'replacement', pos='NOUN',
-                                                           condition="without_cue")
-                verb_with_cue_set = create_disfluencies(verb_with_cue_set, column_text, 'replacement', pos='VERB',
-                                                        condition="with_cue")
-                verb_without_cue_set = create_disfluencies(verb_without_cue_set, column_text, 'replacement', pos='VERB',
-                                                           condition="without_cue")
-                adj_with_cue_set = create_disfluencies(adj_with_cue_set, column_text, 'replacement', pos='ADJ',
-                                                       condition="with_cue")
-                adj_without_cue_set = create_disfluencies(adj_without_cue_set, column_text, 'replacement', pos='ADJ',
-                                                          condition="without_cue")
-
-                print(Fore.GREEN + u'\u2713' + " Creating replacements completed")
-
-                replacement_frames = [noun_with_cue_set,
-                                      noun_without_cue_set,
-                                      verb_with_cue_set,
-                                      verb_without_cue_set,
-                                      adj_with_cue_set,
-                                      adj_without_cue_set]
-
-                final_replacements = pd.concat(replacement_frames)
+def count_rows(input_file_path, column_text):
+    """ Count the rows of the input file of create_dataset, without loading it. """
+    if input_file_path.lower().endswith(".txt"):
+        line_index = LineIndex(input_file_path)
+        n_rows = len(line_index)
+        line_index.close()
+        return n_rows
+    return sum(len(chunk) for chunk in pd.read_csv(input_file_path, usecols=[column_text], chunksize=100 * CHUNK_SIZE))
 
-                if create_all_files:
-                    print("Saving to individual files...")
-                    final_replacements.to_csv(output_dir + "/replacements.csv", index=False)
-                    print(Fore.GREEN + u'\u2713' + " Saving to individual files completed")
 
-                if concat_files:
-                    final_df = final_df.append(final_replacements, ignore_index=True)
+def subtype_fractions(keep_fluent=False,
+                      percentages=None,
+                      percentages_with_fluent=None,
+                      repetition_degrees_percentage=None,
+                      replacement_types_percentage=None):
+    """ Fraction of the input rows that is assigned to each disfluency subtype, for the percentages of create_dataset.
 
-    if not keep_fluent:
+    Returns:
+        fractions (`dict`): The (fraction, create_disfluencies arguments) of each subtype with a non-zero fraction,
+        e.g. {'repetition_2': (0.15, {'disfl_type': 'repetition', 'degree': 2}), ...}
+    """
+    if keep_fluent:
+        if percentages is not None:
+            raise ValueError(
+                "You have to specify percentages with fluent instead of percentages, when keep_fluent is set to True.")
+        type_percentages = percentages_with_fluent if percentages_with_fluent is not None else FLUENT_PERC
+        expected_length = 4
+    else:
         if percentages_with_fluent is not None:
             raise ValueError(
                 "You have to specify percentages instead of percentages_with_fluent, when keep_fluent is set to False.")
+        type_percentages = percentages if percentages is not None else DISFLUENT_PERC
+        expected_length = 3
+
+    # The percentages of the types are validated below
+    valid_length = len(type_percentages) == expected_length
+    if repetition_degrees_percentage is not None and valid_length and type_percentages[-3] == 0:
+        raise ValueError("The percentage of repetitions must be more than 0, when repetition_degrees_percentage is set.")
+    if replacement_types_percentage is not None and valid_length and type_percentages[-1] == 0:
+        raise ValueError("The percentage of replacements must be more than 0, when replacement_types_percentage is set.")
+
+    repetition_degrees_percentage = repetition_degrees_percentage if repetition_degrees_percentage is not None \
+        else REPEAT_PERC
+    replacement_types_percentage = replacement_types_percentage if replacement_types_percentage is not None \
+        else REPLACE_PERC
+
+    for values, length in ((type_percentages, expected_length),
+                           (repetition_degrees_percentage, 3),
+                           (replacement_types_percentage, 6)):
+        if sum(values) != 100:
+            raise ValueError("The sum of percentages must be 100.")
+        if len(values) != length:
+            raise ValueError("A list with length " + str(len(values)) + " is passed. You have to input a list with "
+                                                                         "length " + str(length) + ".")
 
-        if percentages is None:
-            # If not specified from user, set to default percentages
-            print("Percentages were not specified from user.")
-            print("Setting percentages to default values...")
-            print("To change these values, please specify the percentages parameter.\n")
-            percentages = DISFLUENT_PERC
-
-        if percentages is not None:
-            if sum(percentages) != 100:
-                raise ValueError("The sum of percentages must be 100.")
-            if len(percentages) != 3:
-                raise ValueError(
-                    "A list with length " + str(
-                        len(percentages)) + " is passed. You have to input a list with length 3.")
-            else:
-                print("Setting percentages...")
-
-        repetitions = percentages[0]
-        restarts = percentages[1]
-        replacements = percentages[2]
-        print("Repetitions: " + str(repetitions) + "%")
-        print("Restarts: " + str(restarts) + "%")
-        print("Replacements: " + str(replacements) + "%")
-
-        first_split = repetitions / 100
-        second_split = first_split + restarts / 100
-
-        repetition_set, restart_set, replacement_set = np.split(fluent_data, [int(first_split * len(fluent_data)),
-                                                                              int(second_split * len(fluent_data))])
-
-        if repetition_degrees_percentage is None and percentages[0] != 0:
-            print("Repetitions percentages were not specified from user.")
-            print("Setting repetitions percentages to default values...")
-            print("To change these values, please specify the percentages parameter.\n")
+    if not keep_fluent:
+        type_percentages = [0] + list(type_percentages)
 
-            repetition_degrees_percentage = REPEAT_PERC
+    fractions = {}
 
-        if repetition_degrees_percentage is not None and percentages[0] == 0:
-            raise ValueError(
-                "The percentage of repetitions must be more than 0, when repetition_degrees_percentage is set.")
-
-        if repetition_degrees_percentage is not None and percentages[0] != 0:
-            if sum(repetition_degrees_percentage) != 100:
-                raise ValueError("The sum of percentages must be 100.")
-            if len(repetition_degrees_percentage) != 3:
-                raise ValueError(
-                    "A list with length " + str(
-                        len(repetition_degrees_percentage)) + " is passed. You have to input a list with length 3.")
-            else:
-                print("Setting percentages...")
+    def add(fraction, disfl_type, **kwargs):
+        if fraction > 0:
+            fractions[subtype_name(disfl_type, **kwargs)] = (fraction, dict(disfl_type=disfl_type, **kwargs))
 
-            one_reps = repetition_degrees_percentage[0]
-            two_reps = repetition_degrees_percentage[1]
-            three_reps = repetition_degrees_percentage[2]
+    add(type_percentages[0] / 100, 'fluency')
+    for degree, percentage in zip((1, 2, 3), repetition_degrees_percentage):
+        add(type_percentages[1] / 100 * percentage / 100, 'repetition', degree=degree)
+    add(type_percentages[2] / 100, 'restart')
+    for (pos, condition), percentage in zip(REPLACEMENT_TYPES, replacement_types_percentage):
+        add(type_percentages[3] / 100 * percentage / 100, 'replacement', pos=pos, condition=condition)
 
-            print("One-degree repetitions: " + str(one_reps) + "%")
-            print("Second-degree repetitions: " + str(two_reps) + "%")
-            print("Third-degree repetitions: " + str(three_reps) + "%\n")
+    return fractions
 
-            first_split = one_reps / 100
-            second_split = first_split + two_reps / 100
 
-            one_reps_set, two_reps_set, three_reps_set = np.split(repetition_set, [int(first_split * len(fluent_data)),
-                                                                                   int(second_split * len(
-                                                                                       fluent_data))])
+def subtype_bounds(n_rows, fractions):
+    """ Split the input rows into the subtypes of subtype_fractions. The rows of each subtype are a contiguous range
+    and the subtypes follow each other in the order of fractions (the order of the output files).
 
-            print("Creating repetitions...")
-            one_reps_set = create_disfluencies(one_reps_set, column_text, 'repetition', degree=1)
-            two_reps_set = create_disfluencies(two_reps_set, column_text, 'repetition', degree=2)
-            three_reps_set = create_disfluencies(three_reps_set, column_text, 'repetition', degree=3)
-            print(Fore.GREEN + u'\u2713' + " Creating repetition completed")
-            repeat_frames = [one_reps_set, two_reps_set, three_reps_set]
-            final_repeats = pd.concat(repeat_frames)
+    Returns:
+        bounds (`dict`): The [start, stop) positions of the rows of each subtype
+    """
+    bounds = {}
+    start = 0
+    cumulative = 0.0
+    for idx, (subtype, (fraction, _)) in enumerate(fractions.items()):
+        cumulative += fraction
+        # The small tolerance keeps the rounding errors of the sums from moving the bounds
+        stop = n_rows if idx == len(fractions) - 1 else min(n_rows, int(cumulative * n_rows + 1e-9))
+        bounds[subtype] = (start, stop)
+        start = stop
+    return bounds
+
+
+def print_percentages(fractions):
+    print("Percentages of the input rows:")
+    for subtype, (fraction, _) in fractions.items():
+        print("  " + subtype + ": " + "{:g}".format(round(100 * fraction, 2)) + "%")
+    print()
+
+
+def generate(method, args_list, pool=None, progress=None, generator=None, executor=None, line_index=None, rows=None,
+             slot=0):
+    """ Call a method of the generator (a LARD instance or an EncodedCorpus) once for every tuple of arguments, either
+    in the current process, in the threads of an executor or in the worker pool (the last two for LARD only).
+    If no generator is specified, the module LARD instance is used.
+    With the line index of a .txt input and the rows (lines) of the sentences, the workers read the sentences (at
+    position slot of the arguments) from the input instead of receiving them.
+    The arguments are processed in chunks and progress is called with (processed_rows, kept_rows) after each chunk.
+    """
+    if generator is None:
+        generator = lard
 
-            if create_all_files:
-                print("Saving to individual files...")
+    results = []
+    for start in range(0, len(args_list), CHUNK_SIZE):
+        chunk = args_list[start:start + CHUNK_SIZE]
+        if pool is not None and line_index is not None and isinstance(generator, LARD):
+            chunk_results = pool.map_lines(method, chunk, line_index, rows[start:start + CHUNK_SIZE], slot)
+        elif pool is not None and isinstance(generator, LARD):
+            chunk_results = pool.map(method, chunk)
+        elif executor is not None and isinstance(generator, LARD):
+            chunk_results = generator.generate_batch(method, chunk, executor)
+        else:
+            chunk_results = [getattr(generator, method)(*args) for args in chunk]
 
-                final_repeats.to_csv(output_dir + "/repeat.csv", index=False)
-                print(Fore.GREEN + u'\u2713' + " Saving to individual files completed")
+        if progress is not None:
+            progress(len(chunk), sum(result[0] is not None for result in chunk_results))
+        results.extend(chunk_results)
 
-            if concat_files:
-                final_df = final_df.append(final_repeats, ignore_index=True)
+    return results
 
-        if percentages[1] != 0:
-            print("Creating restarts...")
-            restart_set = create_disfluencies(restart_set, column_text, 'restart')
-            print(Fore.GREEN + u'\u2713' + " Creating restarts completed")
 
-            if create_all_files:
-                print("Saving to individual files...")
-                restart_set.to_csv(output_dir + "/restarts.csv", index=False)
+def subtype_name(disfl_type, degree=None, pos=None, condition=None):
+    """ Name of a disfluency subtype, e.g. repetition_2 or replacement_noun_with_cue. """
+    if disfl_type == 'repetition':
+        return disfl_type + "_" + str(degree)
+    if disfl_type == 'replacement':
+        return disfl_type + "_" + pos.lower() + "_" + condition
+    return disfl_type
 
-            if concat_files:
-                final_df = final_df.append(restart_set, ignore_index=True)
 
-        if replacement_types_percentage is None and percentages[2] != 0:
-            print("Replacements percentages were not specified from user.")
-            print("Setting replacements percentages to default values...")
-            print("To change these values, please specify the percentages parameter.\n")
+def encode_input(reader, generator, uncounted_rows=()):
+    """ Encode the input rows into a corpus, applying the max_tokens and time_budget of the generator.
 
-            replacement_types_percentage = REPLACE_PERC
+    Args:
+        reader (`InputReader`): The reader of the input.
 
-        if replacement_types_percentage is not None and percentages[2] == 0:
-            raise ValueError(
-                "The percentage of replacements must be more than 0, when replacement_types_percentage is set.")
-
-        if replacement_types_percentage is not None and percentages[2] != 0:
-            if sum(replacement_types_percentage) != 100:
-                raise ValueError("The sum of percentages must be 100.")
-            if len(replacement_types_percentage) != 6:
-                raise ValueError(
-                    "A list with length " + str(
-                        len(replacement_types_percentage)) + " is passed. You have to input a list with length 6.")
-            else:
-                print("Setting percentages...\n")
-
-        if percentages[2] != 0:
-            noun_with_cue = replacement_types_percentage[0]
-            noun_without_cue = replacement_types_percentage[1]
-            verb_with_cue = replacement_types_percentage[2]
-            verb_without_cue = replacement_types_percentage[3]
-            adj_with_cue = replacement_types_percentage[4]
-            adj_without_cue = replacement_types_percentage[5]
-
-            print("Noun replacements with repair cue: " + str(noun_with_cue) + "%")
-            print("Noun replacements without repair cue: " + str(noun_without_cue) + "%")
-            print("Verb replacements with repair cue: " + str(verb_with_cue) + "%")
-            print("Verb replacements without repair cue: " + str(verb_without_cue) + "%")
-            print("Adjective replacements with repair cue: " + str(adj_with_cue) + "%")
-            print("Adjective replacements without repair cue: " + str(adj_without_cue) + "%\n")
-
-            first_split = noun_with_cue / 100
-            second_split = first_split + noun_without_cue / 100
-            third_split = second_split + verb_with_cue / 100
-            fourth_split = third_split + verb_without_cue / 100
-            fifth_split = fourth_split + adj_with_cue / 100
-
-            noun_with_cue_set, noun_without_cue_set, \
-            verb_with_cue_set, verb_without_cue_set, \
-            adj_with_cue_set, adj_without_cue_set = \
-                np.split(replacement_set, [int(first_split * len(fluent_data)),
-                                           int(second_split * len(fluent_data)),
-                                           int(third_split * len(fluent_data)),
-                                           int(fourth_split * len(fluent_data)),
-                                           int(fifth_split * len(fluent_data))])
-            print("Creating replacements...")
-            print("Warning: This process might take a little longer, especially if you process a large dataset.")
-
-            noun_with_cue_set = create_disfluencies(noun_with_cue_set, column_text, 'replacement', pos='NOUN',
-                                                    condition="with_cue")
-            noun_without_cue_set = create_disfluencies(noun_without_cue_set, column_text, 'replacement', pos='NOUN',
-                                                       condition="without_cue")
-            verb_with_cue_set = create_disfluencies(verb_with_cue_set, column_text, 'replacement', pos='VERB',
-                                                    condition="with_cue")
-            verb_without_cue_set = create_disfluencies(verb_without_cue_set, column_text, 'replacement', pos='VERB',
-                                                       condition="without_cue")
-            adj_with_cue_set = create_disfluencies(adj_with_cue_set, column_text, 'replacement', pos='ADJ',
-                                                   condition="with_cue")
-            adj_without_cue_set = create_disfluencies(adj_without_cue_set, column_text, 'replacement', pos='ADJ',
-                                                      condition="without_cue")
-
-            print(Fore.GREEN + u'\u2713' + " Creating replacements completed")
-
-            replacement_frames = [noun_with_cue_set,
-                                  noun_without_cue_set,
-                                  verb_with_cue_set,
-                                  verb_without_cue_set,
-                                  adj_with_cue_set,
-                                  adj_without_cue_set]
-
-            final_replacements = pd.concat(replacement_frames)
+        generator (`LARD`): The LARD instance whose guards are applied.
 
-            if create_all_files:
-                print("Saving to individual files...")
-                final_replacements.to_csv(output_dir + "/replacements.csv", index=False)
-                print(Fore.GREEN + u'\u2713' + " Saving to individual files completed")
+        uncounted_rows (List[`range`], *optional*, defaults to ()): The positions of the rows whose guards are
+        counted when they are generated, so not when they are encoded.
 
-            if concat_files:
-                final_df = final_df.append(final_replacements, ignore_index=True)
+    Returns:
+        corpus (`EncodedCorpus`): The encoded corpus, with a row for every input row
+    """
+    counting = [True]
+
+    def texts():
+        for position, text in enumerate(reader.texts()):
+            counting[0] = not any(position in rows for rows in uncounted_rows)
+            yield text
+
+    return EncodedCorpus.from_sentences(texts(),
+                                        tokenize=lambda text: generator.tokenize_within_budget(text, counting[0]),
+                                        rng=generator.rng)
+
+
+def default_partner_sampler(set, column_text, corpus=None, rng=random):
+    """ Draw the partner sentences of the restarts from the sentences of the set (or their rows in the corpus). """
+    if corpus is not None:
+        rows = set.index.tolist()
+        # Draws the same random numbers as rng.choice
+        return lambda: rows[rng.randrange(len(rows))]
+    fluent_text = set[column_text].values.tolist()
+    return lambda: rng.choice(fluent_text)
+
+
+def create_disfluencies(set, column_text, disfl_type, degree=None, pos=None, condition=None, pool=None,
+                        progress_callback=None, output=None, partner_sampler=None, corpus=None, generator=None,
+                        executor=None, line_index=None):
+    # With an encoded corpus, the index of the set is the row of each sentence in the corpus, and the partner
+    # sentences of the restarts are drawn as rows of the corpus. With the line index of a .txt input, the index of
+    # the set is the line of each sentence, that the workers read from the input
+    if generator is None:
+        generator = lard
+
+    if output is not None and len(set) != 0:
+        # Pass each chunk to the output as soon as it is created, and keep nothing in memory
+        if disfl_type == 'restart' and partner_sampler is None:
+            partner_sampler = default_partner_sampler(set, column_text, corpus, generator.rng)
+
+        for start in range(0, len(set), CHUNK_SIZE):
+            output(disfl_type, create_disfluencies(set.iloc[start:start + CHUNK_SIZE].copy(), column_text, disfl_type,
+                                                   degree, pos, condition, pool, progress_callback,
+                                                   partner_sampler=partner_sampler, corpus=corpus,
+                                                   generator=generator, executor=executor, line_index=line_index))
+        return set.iloc[0:0]
 
-    if concat_files:
-        print("Concatenating and saving to file...")
-        final_df.to_csv(output_dir + "/final_disfluent_set.csv", index=False)
-        print(Fore.GREEN + u'\u2713' + " Saving completed")
+    if len(set) != 0:
+        subtype = subtype_name(disfl_type, degree, pos, condition)
 
+        def progress(processed_rows, kept_rows):
+            if progress_callback is not None:
+                progress_callback(subtype, processed_rows, kept_rows)
 
-def create_disfluencies(set, column_text, disfl_type, degree=None, pos=None, condition=None):
-    if len(set) != 0:
         if disfl_type == 'repetition':
+            if corpus is not None:
+                args_list = [(row, degree) for row in set.index]
+            else:
+                args_list = [(text, degree) for text in set[column_text]]
             set[['disfluent_sentence', 'fluent_tokens', 'disfluent_tokens',
-                 'annotations', 'degree']] = set.apply(lambda row: lard.create_repetitions(row[column_text], degree),
-                                                       axis=1,
-                                                       result_type='expand')
+                 'annotations', 'degree']] = pd.DataFrame(
+                generate('create_repetitions', args_list, pool, progress,
+                         corpus if corpus is not None else generator, executor, line_index, set.index),
+                index=set.index)
             set['label'] = 1
             set['disfl_type'] = 'repetition'
 
         if disfl_type == 'replacement':
             if condition == 'with_cue':
                 set[['disfluent_sentence', 'fluent_tokens', 'disfluent_tokens',
-                     'annotations', 'disfl_type']] = set.apply(
-                    lambda row: lard.create_replacements(row[column_text], pos, with_cue=True),
-                    axis=1,
-                    result_type='expand')
+                     'annotations', 'disfl_type']] = pd.DataFrame(
+                    generate('create_replacements', [(text, pos, True) for text in set[column_text]], pool,
+                             progress, generator, executor, line_index, set.index),
+                    index=set.index)
                 set['label'] = 2
                 set['degree'] = 'N/A'
             if condition == "without_cue":
                 set[['disfluent_sentence', 'fluent_tokens', 'disfluent_tokens',
-                     'annotations', 'disfl_type']] = set.apply(
-                    lambda row: lard.create_replacements(row[column_text], pos, with_cue=False),
-                    axis=1,
-                    result_type='expand')
+                     'annotations', 'disfl_type']] = pd.DataFrame(
+                    generate('create_replacements', [(text, pos, False) for text in set[column_text]], pool,
+                             progress, generator, executor, line_index, set.index),
+                    index=set.index)
                 set['label'] = 2
                 set['degree'] = 'N/A'
         if disfl_type == 'fluency':
-            set['fluent_tokens'] = set[column_text].apply(lambda x: nltk.word_tokenize(x))
-            set['disfluent_tokens'] = set['fluent_tokens']
+            # The rows skipped by max_tokens or time_budget have no tokens and are dropped
+            if corpus is not None:
+                fluent_tokens = [None if corpus.is_skipped(row) else corpus.tokens(row) for row in set.index]
+            else:
+                fluent_tokens = [generator.tokenize_within_budget(text) for text in set[column_text]]
+            set['fluent_tokens'] = fluent_tokens
+            set['disfluent_tokens'] = fluent_tokens
 
             set['disfluent_sentence'] = set[column_text]
-            set['annotations'] = set.apply(lambda row: len(row['fluent_tokens']) * ["F"], axis=1)
+            set['annotations'] = [None if tokens is None else len(tokens) * ["F"] for tokens in fluent_tokens]
             set['disfl_type'] = 'fluency'
             set['label'] = 0
             set['degree'] = 'N/A'
+            progress(len(set), sum(tokens is not None for tokens in fluent_tokens))
 
         if disfl_type == 'restart':
             disfluent_sentence = []
@@ -536,14 +653,26 @@ def create_disfluencies(set, column_text, disfl_type, degree=None, pos=None, con
             annotations = []
             disfl_type = []
 
-            fluent_text = set[column_text].values.tolist()
-            for i in range(len(fluent_text)):
-                fluent_sentence_1 = random.choice(fluent_text)
-                fluent_sentence_2 = fluent_text[i]
-
-                if fluent_sentence_1 != fluent_sentence_2:
-                    tmp_disfluent_sentence, tmp_fluent_tokens, tmp_disfluent_tokens, tmp_annotations, tmp_disfl_type = lard.create_restarts(
-                        fluent_sentence_1, fluent_sentence_2)
+            if partner_sampler is None:
+                partner_sampler = default_partner_sampler(set, column_text, corpus, generator.rng)
+            if corpus is not None:
+                sentence_pairs = [(partner_sampler(), row) for row in set.index]
+                different = [not corpus.same_text(*pair) for pair in sentence_pairs]
+            else:
+                fluent_text = set[column_text].values.tolist()
+                sentence_pairs = [(partner_sampler(), fluent_text[i]) for i in range(len(fluent_text))]
+                different = [pair[0] != pair[1] for pair in sentence_pairs]
+            restart_pairs = [pair for pair, is_different in zip(sentence_pairs, different) if is_different]
+            restart_rows = [row for row, is_different in zip(set.index, different) if is_different]
+            restarts = iter(generate('create_restarts', restart_pairs, pool, progress,
+                                     corpus if corpus is not None else generator, executor, line_index, restart_rows,
+                                     slot=1))
+            progress(len(sentence_pairs) - len(restart_pairs), 0)
+
+            for is_different in different:
+                if is_different:
+                    tmp_disfluent_sentence, tmp_fluent_tokens, tmp_disfluent_tokens, tmp_annotations, tmp_disfl_type = next(
+                        restarts)
 
                 else:
                     tmp_disfluent_sentence, tmp_fluent_tokens, tmp_disfluent_tokens, tmp_annotations, tmp_disfl_type = None, None, None, None, None
@@ -0,0 +1,223 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+from colorama import Fore
+
+from python_files.disfluency_generation import LARD
+from python_files.encoded_corpus import EncodedCorpus
+from python_files.scale_harness import sample_length, synthesize_sentence
+from python_files.worker_pool import LARDPool
+
+SAMPLE_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sample_data",
+                                "sample_data.csv")
+
+RESULT_FIELDS = ['disfluent_sentence', 'fluent_tokens', 'disfluent_tokens', 'annotations', 'disfl_type']
+
+# The optimized implementations that are compared with the reference, by name
+FAST_PATHS = {}
+
+
+def register_path(name, kinds=('repetition', 'restart', 'replacement'), reference=None):
+    """ Register an optimized implementation to compare with a reference implementation.
+    The implementation is called with (kind, params, inputs, seed) and must return the result of each input,
+    as the reference LARD methods would return it with LARD(seed=seed). Implementations that draw their random
+    numbers differently can be registered with their own reference, that is called with the same arguments.
+    """
+    def decorator(function):
+        FAST_PATHS[name] = (function, tuple(kinds), reference)
+        return function
+    return decorator
+
+
+METHODS = {'repetition': 'create_repetitions', 'restart': 'create_restarts', 'replacement': 'create_replacements'}
+
+
+def arguments(kind, params, item):
+    if kind == 'repetition':
+        return item, params['degree']
+    if kind == 'restart':
+        return item[0], item[1]
+    return item, params['pos'], params['with_cue']
+
+
+def call(lard, kind, params, item, rng=None):
+    return getattr(lard, METHODS[kind])(*arguments(kind, params, item), rng=rng)
+
+
+def reference(kind, params, inputs, seed):
+    """ The reference implementation: the LARD methods, one input at a time. """
+    lard = LARD(seed=seed)
+    return [call(lard, kind, params, item) for item in inputs]
+
+
+@register_path('replacements_batch', kinds=('replacement',))
+def replacements_batch(kind, params, inputs, seed):
+    lard = LARD(seed=seed)
+    return lard.create_replacements_batch(inputs, params['pos'], params['with_cue'])
+
+
+def batch_reference(kind, params, inputs, seed):
+    """ The reference of the batch paths: the LARD methods, one input at a time, each with the random generator
+    that the batch derives for its position (see LARD.generate_batch).
+    """
+    lard = LARD(seed=seed)
+    batch_seed = str(lard.rng.getrandbits(64)) + ":"
+    return [call(lard, kind, params, item, random.Random(batch_seed + str(idx))) for idx, item in enumerate(inputs)]
+
+
+@register_path('thread_pool', reference=batch_reference)
+def thread_pool(kind, params, inputs, seed):
+    return LARD(seed=seed).generate_batch(METHODS[kind], [arguments(kind, params, item) for item in inputs],
+                                          threads=4)
+
+
+@register_path('worker_pool', reference=batch_reference)
+def worker_pool(kind, params, inputs, seed):
+    with LARDPool(2, lard=LARD(seed=seed)) as pool:
+        return pool.map(METHODS[kind], [arguments(kind, params, item) for item in inputs])
+
+
+@register_path('encoded', kinds=('repetition', 'restart'))
+def encoded(kind, params, inputs, seed):
+    if kind == 'repetition':
+        corpus = EncodedCorpus.from_sentences(inputs, rng=random.Random(seed))
+        return [corpus.create_repetitions(row, params['degree']) for row in range(len(corpus))]
+
+    # The restarts are created from the rows of the sentences and of their partners
+    sentences = [fluent_sentence for _, fluent_sentence in inputs]
+    corpus = EncodedCorpus.from_sentences(sentences, rng=random.Random(seed))
+    rows = {sentence: row for row, sentence in enumerate(sentences)}
+    return [corpus.create_restarts(rows[partner], row) for row, (partner, _) in enumerate(inputs)]
+
+
+def lexicon_path(lexicon):
+    """ Implementation that looks up the replacements in a compiled lexicon instead of WordNet. """
+    def run(kind, params, inputs, seed):
+        lard = LARD(lexicon=lexicon, seed=seed)
+        return [call(lard, kind, params, item) for item in inputs]
+    return run
+
+
+def generated_corpus(n_rows, seed=0, mean_length=12):
+    rng = random.Random(seed)
+    return [synthesize_sentence(sample_length(rng, 'lognormal', mean_length, 200), rng) for _ in range(n_rows)]
+
+
+def cases(sentences):
+    """ The (kind, params, inputs) of every comparison over a list of sentences. """
+    # Restarts pair every sentence with a fixed, different partner
+    pairs = [(sentences[(i + 1) % len(sentences)], sentences[i]) for i in range(len(sentences))]
+
+    for degree in (1, 2, 3):
+        yield 'repetition', {'degree': degree}, sentences
+    yield 'restart', {}, pairs
+    for pos in (None, 'NOUN', 'VERB', 'ADJ'):
+        for with_cue in (True, False):
+            yield 'replacement', {'pos': pos, 'with_cue': with_cue}, sentences
+
+
+def timed(function, *args):
+    # The warnings of LARD are not part of the comparison
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        results = function(*args)
+        return results, time.perf_counter() - start
+
+
+def compare(reference_results, fast_results, inputs, max_divergences=10):
+    """ Compare the results of the two implementations field by field.
+
+    Returns:
+        divergences (List[`dict`]): The offending input, the field and the two values of each divergence
+    """
+    divergences = []
+    if len(reference_results) != len(fast_results):
+        return [{'input': None, 'field': 'length', 'reference': len(reference_results), 'fast': len(fast_results)}]
+
+    for item, expected, actual in zip(inputs, reference_results, fast_results):
+        for field, expected_value, actual_value in zip(RESULT_FIELDS, expected, actual):
+            if expected_value != actual_value:
+                divergences.append({'input': item, 'field': field, 'reference': expected_value, 'fast': actual_value})
+                break
+        if len(divergences) >= max_divergences:
+            break
+    return divergences
+
+
+def run_differential(corpora, paths=None, seed=0, max_divergences=10):
+    """ Run the reference and the optimized implementations side by side and compare their outputs.
+
+    Args:
+        corpora (`dict`): The sentences of each corpus, by name.
+
+        paths (List[`str`], *optional*, defaults to 'None'): The names of the registered implementations to check.
+        If not specified, all the registered implementations are checked.
+
+        seed (`int`, *optional*, defaults to 0): The seed of every run.
+
+        max_divergences (`int`, *optional*, defaults to 10): The maximum number of divergences reported per case.
+
+    Returns:
+        report (List[`dict`]): The divergences and the speedup of each implementation, corpus and case
+    """
+    paths = list(FAST_PATHS) if paths is None else paths
+    report = []
+
+    for corpus_name, sentences in corpora.items():
+        sentences = [sentence for sentence in sentences if isinstance(sentence, str) and sentence]
+        for kind, params, inputs in cases(sentences):
+            references = {}
+
+            for name in paths:
+                function, kinds, path_reference = FAST_PATHS[name]
+                if kind not in kinds:
+                    continue
+                # The reference results are computed once per reference implementation
+                path_reference = path_reference if path_reference is not None else reference
+                if path_reference not in references:
+                    references[path_reference] = timed(path_reference, kind, params, inputs, seed)
+                reference_results, reference_time = references[path_reference]
+
+                fast_results, fast_time = timed(function, kind, params, inputs, seed)
+                divergences = compare(reference_results, fast_results, inputs, max_divergences)
+
+                report.append({'path': name, 'corpus': corpus_name, 'kind': kind, 'params': params,
+                               'rows': len(inputs), 'reference_time': reference_time, 'fast_time': fast_time,
+                               'speedup': reference_time / fast_time if fast_time > 0 else None,
+                               'divergences': divergences})
+
+                status = Fore.GREEN + "same" if not divergences else Fore.RED + str(len(divergences)) + " divergent"
+                print(name + " | " + corpus_name + " | " + kind + " " + str(params) + ": " + status
+                      + Fore.RESET + ", speedup " + "{:.2f}".format(report[-1]['speedup'] or 0) + "x")
+                for divergence in divergences:
+                    print(Fore.RED + "  input: " + repr(divergence['input']))
+                    print(Fore.RED + "  " + divergence['field'] + ": reference " + repr(divergence['reference'])
+                          + " != fast " + repr(divergence['fast']))
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the optimized LARD paths match the reference output.")
+    parser.add_argument("--paths", nargs="+", default=None, help="Implementations to check (defaults to all)")
+    parser.add_argument("--lexicon", default=None, help="Also check the replacements of a compiled lexicon")
+    parser.add_argument("--generated-rows", type=int, default=1000, help="Rows of the generated corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.lexicon is not None:
+        register_path('lexicon', kinds=('replacement',))(lexicon_path(args.lexicon))
+
+    corpora = {'sample_data': pd.read_csv(SAMPLE_DATA_PATH)['text'].tolist()}
+    if args.generated_rows > 0:
+        corpora['generated'] = generated_corpus(args.generated_rows, args.seed)
+
+    results = run_differential(corpora, args.paths, args.seed)
+    if any(result['divergences'] for result in results):
+        sys.exit(1)
@@ -1,16 +1,205 @@
-import string, random, math
+import string, random, math, time
+import asyncio
+import collections
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import nltk
 from colorama import Fore, init
-from random import randrange
+from python_files.lexicon import Lexicon
 from python_files.utils import extract_pos_format, \
     none_tuple, revert_pos_format, extract_syns_ants, \
-    REPAIR_CUES
+    REPAIR_CUES, sentence_spans, align_token_offsets
 
 init(autoreset=True)
 
+# Types of the disfluencies of the document mode, in the order of its percentages
+DOCUMENT_TYPES = ['repetition', 'restart', 'replacement']
+DOCUMENT_PERC = [50, 25, 25]
+
+# What to do with the sequences that have more than max_tokens tokens
+OVERFLOW_MODES = ['skip', 'truncate']
+
+
+def _call_counted(lard, method, args, rng):
+    # Runs in a worker process: the guards counted by the copy of LARD are returned with the result
+    result = getattr(lard, method)(*args, rng=rng)
+    return result, dict(lard.guard_counts)
+
+
 class LARD:
 
-    def create_repetitions(self, fluent_sentence, degree=None):
+    def __init__(self, lexicon=None, executor=None, max_in_flight=8, seed=None, max_tokens=None, overflow='skip',
+                 time_budget=None):
+        """ Initialize LARD.
+
+        Args:
+            lexicon (`str` or `Lexicon`, *optional*, defaults to 'None'): The path of a replacement lexicon compiled
+            with python_files/lexicon.py (or an opened Lexicon). If it is specified, the synonyms and antonyms of the
+            replacements are looked up in the memory-mapped lexicon instead of WordNet.
+
+            executor (`concurrent.futures.Executor`, *optional*, defaults to 'None'): The thread or process
+            executor that the async methods offload the generation to. If it is not specified, the default
+            executor of the event loop is used.
+
+            max_in_flight (`int`, *optional*, defaults to 8): The maximum number of async requests that are
+            offloaded to the executor at the same time.
+
+            seed (`int`, *optional*, defaults to 'None'): The seed of the random generator of the instance.
+            If it is not specified, the generator is seeded from the operating system.
+
+            max_tokens (`int`, *optional*, defaults to 'None'): The maximum number of tokens of a fluent sequence.
+            The whitespace-separated words are counted before tokenization, so that very long sequences are not
+            tokenized at all, and the tokens are counted again after tokenization. If it is not specified,
+            the length of the sequences is not limited.
+
+            overflow (`str`, *optional*, defaults to 'skip'): What to do with the sequences that have more than
+            max_tokens tokens: skip them or truncate them to their first max_tokens tokens.
+
+            time_budget (`float`, *optional*, defaults to 'None'): The maximum processing time of a sequence in
+            seconds. It is checked between the stages (after the tokenization and after the tagging), and the
+            sequences that exceed it are skipped without running the later stages. The last stage of a sequence is
+            not interrupted. If it is not specified, the processing time is not limited.
+
+        The skipped and the truncated sequences are counted (see guard_stats).
+        """
+        if overflow not in OVERFLOW_MODES:
+            raise ValueError("Supported overflow modes: " + ", ".join(OVERFLOW_MODES))
+        if max_tokens is not None and max_tokens < 1:
+            raise ValueError("The maximum number of tokens must be at least 1.")
+
+        if isinstance(lexicon, str):
+            lexicon = Lexicon(lexicon)
+        self.lexicon = lexicon
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self._semaphores = {}
+        # Every instance draws from its own random generator, so that instances do not share random state
+        self.rng = random.Random(seed)
+
+        self.max_tokens = max_tokens
+        self.overflow = overflow
+        self.time_budget = time_budget
+        self.guard_counts = collections.Counter()
+        self._guard_lock = threading.Lock()
+
+    def __getstate__(self):
+        # The executor, the semaphores and the guard counts stay in the calling process, e.g. when LARD is sent to
+        # a process executor
+        state = self.__dict__.copy()
+        state['executor'] = None
+        state['_semaphores'] = {}
+        state['guard_counts'] = collections.Counter()
+        del state['_guard_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._guard_lock = threading.Lock()
+
+    def _count(self, guard):
+        with self._guard_lock:
+            self.guard_counts[guard] += 1
+
+    def merge_guard_counts(self, counts):
+        """ Add the guard counts of a copy of LARD, e.g. of a worker process. """
+        with self._guard_lock:
+            self.guard_counts.update(counts)
+
+    def guard_stats(self):
+        """ The number of sequences that were skipped because of max_tokens or time_budget,
+        and the number of sequences that were truncated.
+        """
+        with self._guard_lock:
+            return {guard: self.guard_counts[guard] for guard in ('max_tokens', 'time_budget', 'truncated')}
+
+    def tokenize(self, fluent_sentence, count=True):
+        """ Tokenize a fluent sequence, applying max_tokens.
+
+        Args:
+            fluent_sentence (`str`): A fluent text sequence
+
+            count (`bool`, *optional*, defaults to True): Whether or not to count the sequence, if it is skipped or
+            truncated. The partner sentences of the restarts are not counted, so that each sequence is counted once.
+
+        Returns:
+            fluent_tokens (List[`str`]): The tokens of the sequence, or None if the sequence is skipped
+        """
+        if self.max_tokens is None:
+            return nltk.word_tokenize(fluent_sentence)
+
+        truncated = False
+        # The whitespace-separated words are a cheap lower bound of the number of tokens
+        words = fluent_sentence.split()
+        if len(words) > self.max_tokens:
+            if self.overflow == 'skip':
+                return self._skip_long(count)
+            fluent_sentence = " ".join(words[:self.max_tokens])
+            truncated = True
+
+        fluent_tokens = nltk.word_tokenize(fluent_sentence)
+        if len(fluent_tokens) > self.max_tokens:
+            if self.overflow == 'skip':
+                return self._skip_long(count)
+            fluent_tokens = fluent_tokens[:self.max_tokens]
+            truncated = True
+
+        if truncated and count:
+            self._count('truncated')
+        return fluent_tokens
+
+    def tokenize_within_budget(self, fluent_sentence, count=True):
+        """ Tokenize a fluent sequence, applying max_tokens and time_budget, for the paths that only tokenize
+        (the fluencies and the encoded corpus). As in the LARD methods, a sequence whose tokenization exceeds the
+        time budget is skipped, so the same sequences are skipped on every path.
+
+        Args:
+            fluent_sentence (`str`): A fluent text sequence
+
+            count (`bool`, *optional*, defaults to True): Whether or not to count the sequence, if it is skipped or
+            truncated.
+
+        Returns:
+            fluent_tokens (List[`str`]): The tokens of the sequence, or None if the sequence is skipped
+        """
+        started = time.perf_counter()
+        fluent_tokens = self.tokenize(fluent_sentence, count)
+        if fluent_tokens is None or self._over_budget(started, count):
+            return None
+        return fluent_tokens
+
+    def _exceeds_max_tokens(self, fluent_sentence):
+        if self.max_tokens is None:
+            return False
+        return len(fluent_sentence.split()) > self.max_tokens or \
+            len(nltk.word_tokenize(fluent_sentence)) > self.max_tokens
+
+    def _skip_long(self, count=True):
+        print("Warning! The sequence has more than " + str(self.max_tokens) + " tokens. Ignoring this sequence...")
+        if count:
+            self._count('max_tokens')
+        return None
+
+    def _over_budget(self, started, count=True):
+        if self.time_budget is not None and time.perf_counter() - started > self.time_budget:
+            print("Warning! The time budget of the sequence was exceeded. Ignoring this sequence...")
+            if count:
+                self._count('time_budget')
+            return True
+        return False
+
+    def find_replacements(self, word, pos):
+        """ Find the possible replacements (synonyms and antonyms, except for the word itself) of a candidate word.
+        Each replacement is returned as a list of tokens.
+        """
+        if self.lexicon is not None:
+            return self.lexicon.replacements(word, pos)
+
+        synonyms, antonyms = extract_syns_ants(word, pos)
+        return [replacement.split("_") for replacement in synonyms + antonyms
+                if replacement.lower() != word.lower()]
+
+    def create_repetitions(self, fluent_sentence, degree=None, rng=None):
         """ Create repetitions.
         This function is used to create different degree repetitions in a fluent sequence.
 
@@ -21,6 +210,9 @@ class LARD:
             If it is not specified the default value is set to None and the degree is randomly initialized
             inside the function.
 
+            rng (`random.Random`, *optional*, defaults to 'None'): The random generator of the call. If it is not
+            specified, the random generator of LARD is used.
+
         Returns:
             disfluent_sentence (`str`): The disfluent sentence with the corresponding repetition
 
@@ -33,6 +225,10 @@ class LARD:
 
             disfl_type (`str): Type of disfluency
         """
+        if rng is None:
+            rng = self.rng
+        started = time.perf_counter()
+
         annotations = []
         disfluent_tokens = []
 
@@ -40,7 +236,9 @@ class LARD:
             raise TypeError('''A 'NoneType' object received while a 'str' object is required.''')
         else:
             # Tokenize the sentence
-            fluent_tokens = nltk.word_tokenize(fluent_sentence)
+            fluent_tokens = self.tokenize(fluent_sentence)
+            if fluent_tokens is None or self._over_budget(started):
+                return none_tuple
 
         if len(fluent_tokens) == 1:
             if degree > 1:
@@ -58,7 +256,7 @@ class LARD:
         elif len(fluent_tokens) == 2:
             if degree > 2:
                 # We can create first or second degree repetitions
-                degree = random.randint(1, 2)
+                degree = rng.randint(1, 2)
                 print(
                     "Warning! Only a first or second degree repetition can be created, because input sequence contains only one "
                     "token.")
@@ -68,7 +266,7 @@ class LARD:
         # First-degree repetitions
         if degree == 1:
             try:
-                random_repeat_idx = random.choice(
+                random_repeat_idx = rng.choice(
                     [idx for idx in range(len(fluent_tokens)) if fluent_tokens[idx] not in string.punctuation])
             except IndexError:
                 print(
@@ -87,7 +285,7 @@ class LARD:
         # Second-degree repetitions
         if degree == 2:
             try:
-                random_repeat_idx = random.choice([idx for idx in range(len(fluent_tokens) - 1) if
+                random_repeat_idx = rng.choice([idx for idx in range(len(fluent_tokens) - 1) if
                                                    fluent_tokens[idx] not in string.punctuation and fluent_tokens[
                                                        idx + 1] not in string.punctuation])
             except IndexError:
@@ -109,7 +307,7 @@ class LARD:
         # Third-degree repetitions
         if degree == 3:
             try:
-                random_repeat_idx = random.choice([idx for idx in range(len(fluent_tokens) - 2) if
+                random_repeat_idx = rng.choice([idx for idx in range(len(fluent_tokens) - 2) if
                                                    fluent_tokens[idx] not in string.punctuation and fluent_tokens[
                                                        idx + 1] not in string.punctuation and fluent_tokens[
                                                        idx + 2] not in string.punctuation])
@@ -138,7 +336,7 @@ class LARD:
 
         return disfluent_sentence, fluent_tokens, disfluent_tokens, annotations, degree
 
-    def create_restarts(self, fluent_sentence_1, fluent_sentence_2):
+    def create_restarts(self, fluent_sentence_1, fluent_sentence_2, rng=None):
         """ Create restarts.
                 This function is used to create restarts, given two different fluent sequences.
 
@@ -147,6 +345,9 @@ class LARD:
 
                     fluent_sentence_2 (`str`): A fluent text sequence, different from fluent_sentence_1
 
+                    rng (`random.Random`, *optional*, defaults to 'None'): The random generator of the call.
+                    If it is not specified, the random generator of LARD is used.
+
                 Returns:
                     disfluent_sentence (`str`): The disfluent sentence with the corresponding restart
 
@@ -160,12 +361,20 @@ class LARD:
                     disfl_type (`str): Type of disfluency
 
                 """
+        if rng is None:
+            rng = self.rng
+        started = time.perf_counter()
+
         if not fluent_sentence_1 or not fluent_sentence_2:
             raise TypeError('''A 'NoneType' object received while a 'str' object is required.''')
         else:
-            # Tokenize both sentences
-            fluent_for_disfluent_tokens = nltk.word_tokenize(fluent_sentence_1)
-            fluent_tokens = nltk.word_tokenize(fluent_sentence_2)
+            # Tokenize both sentences. The restarted sentence is a partner sentence, that is not counted by the guards
+            fluent_for_disfluent_tokens = self.tokenize(fluent_sentence_1, count=False)
+            if fluent_for_disfluent_tokens is None:
+                return none_tuple
+            fluent_tokens = self.tokenize(fluent_sentence_2)
+            if fluent_tokens is None or self._over_budget(started):
+                return none_tuple
 
         disfl_type = 'restart'
 
@@ -175,7 +384,7 @@ class LARD:
             return none_tuple
 
         # Select the position of restart (We opt for creating restarts in the beginning of the sentence)
-        random_location_idx = randrange(2, math.ceil(len(fluent_for_disfluent_tokens) / 2) + 2)
+        random_location_idx = rng.randrange(2, math.ceil(len(fluent_for_disfluent_tokens) / 2) + 2)
 
         if all(fluent_for_disfluent_tokens[i] == fluent_tokens[i] for i in range(random_location_idx)):
             print("Warning! Same sequence is detected, aborted to avoid creating a repetition instead of restart...")
@@ -210,7 +419,7 @@ class LARD:
 
         return disfluent_sentence, fluent_tokens, disfluent_tokens, annotations, disfl_type
 
-    def create_replacements(self, fluent_sentence, candidate_pos=None, with_cue=True):
+    def create_replacements(self, fluent_sentence, candidate_pos=None, with_cue=True, rng=None):
         """ Create restarts.
                  This function is used to create replacements, given two different fluent sequences.
 
@@ -225,6 +434,9 @@ class LARD:
                      with_cue (`bool`, *optional*, defaults to True): Whether or not to create replacement with
                      repair cue. If not specified the default value is set to True.
 
+                     rng (`random.Random`, *optional*, defaults to 'None'): The random generator of the call.
+                     If it is not specified, the random generator of LARD is used.
+
                  Returns:
                      disfluent_sentence (`str`): The disfluent sentence with the corresponding replacement
 
@@ -242,13 +454,90 @@ class LARD:
         if not fluent_sentence:
             raise TypeError('''A 'NoneType' object received while a 'str' object is required.''')
         else:
+            started = time.perf_counter()
             # Tokenize the sentence
-            fluent_tokens = nltk.word_tokenize(fluent_sentence)
+            fluent_tokens = self.tokenize(fluent_sentence)
+            if fluent_tokens is None or self._over_budget(started):
+                return none_tuple
             if len(fluent_tokens) < 2:
                 print("Warning! We need at least two tokens to create a replacement. Ignoring this sequence...")
                 return none_tuple
             # Find pos tag for each token
             pos_tags = nltk.pos_tag(fluent_tokens)
+            if self._over_budget(started):
+                return none_tuple
+
+        return self.replace_candidate(fluent_tokens, pos_tags, candidate_pos, with_cue, rng=rng)
+
+    def create_replacements_batch(self, fluent_sentences, candidate_pos=None, with_cue=True):
+        """ Create replacements for a batch of fluent sequences.
+        The sequences are tagged together and the replacements of each candidate word are looked up once per batch.
+        The result of each sequence is the same with create_replacements. The stages are shared by the batch, so
+        time_budget is not applied.
+
+        Args:
+            fluent_sentences (List[`str`]): A list of fluent text sequences
+
+            candidate_pos (`str`, *optional*, defaults to None): The desired candidate part of speech, as in
+            create_replacements.
+
+            with_cue (`bool`, *optional*, defaults to True): Whether or not to create replacements with repair cue.
+
+        Returns:
+            disfluencies (List[`tuple`]): The result of create_replacements for each fluent sequence
+        """
+        tokenized_sentences = []
+        for fluent_sentence in fluent_sentences:
+            if not fluent_sentence:
+                raise TypeError('''A 'NoneType' object received while a 'str' object is required.''')
+            tokenized_sentences.append(self.tokenize(fluent_sentence))
+
+        pos_tags = iter(nltk.pos_tag_sents([tokens for tokens in tokenized_sentences
+                                            if tokens is not None and len(tokens) >= 2]))
+
+        cache = {}
+
+        def find_cached_replacements(word, pos):
+            if (word, pos) not in cache:
+                cache[(word, pos)] = self.find_replacements(word, pos)
+            return cache[(word, pos)]
+
+        disfluencies = []
+        for fluent_tokens in tokenized_sentences:
+            if fluent_tokens is None:
+                disfluencies.append(none_tuple)
+            elif len(fluent_tokens) < 2:
+                print("Warning! We need at least two tokens to create a replacement. Ignoring this sequence...")
+                disfluencies.append(none_tuple)
+            else:
+                disfluencies.append(self.replace_candidate(fluent_tokens, next(pos_tags), candidate_pos, with_cue,
+                                                           find_cached_replacements))
+
+        return disfluencies
+
+    def replace_candidate(self, fluent_tokens, pos_tags, candidate_pos=None, with_cue=True, find_replacements=None,
+                          rng=None):
+        """ Create a replacement from an already tokenized and tagged fluent sequence.
+        This function is used by create_replacements after tokenization and part of speech tagging.
+
+        Args:
+            fluent_tokens (List[`str`]): List of fluent tokens of the fluent sequence
+
+            pos_tags (List[`tuple`]): The (token, tag) pairs of the fluent tokens
+
+            find_replacements (`callable`, *optional*, defaults to None): The function that finds the possible
+            replacements of a (word, pos) pair. If not specified, find_replacements of LARD is used.
+
+            rng (`random.Random`, *optional*, defaults to 'None'): The random generator of the call. If it is not
+            specified, the random generator of LARD is used.
+
+        Returns:
+            The same with create_replacements
+        """
+        if find_replacements is None:
+            find_replacements = self.find_replacements
+        if rng is None:
+            rng = self.rng
 
         # Create list for all possible replacement candidates
         candidates = []
@@ -265,7 +554,7 @@ class LARD:
             return none_tuple
 
         # Select randomly a candidate token to replace
-        random_candidate_idx = randrange(len(candidates))
+        random_candidate_idx = rng.randrange(len(candidates))
         # Extract pos
         non_formatted_pos = candidates[random_candidate_idx][2]
         # Revert pos to the right form for NLTK library
@@ -277,22 +566,13 @@ class LARD:
             disfl_type = formatted_pos.lower() + "_without_cue"
 
         # Find synonyms and antonyms
-        synonyms, antonyms = extract_syns_ants(candidates[random_candidate_idx][0], formatted_pos)
-
-        possible_replacements = synonyms + antonyms
+        possible_replacements = find_replacements(candidates[random_candidate_idx][0], formatted_pos)
 
         if len(possible_replacements) > 0:
-            try:
-                replaced_candidate = random.choice(
-                    [possible_replacements[idx] for idx in range(len(possible_replacements)) if
-                     possible_replacements[idx].lower() != candidates[random_candidate_idx][0].lower()])
-            except IndexError:
-                print(Fore.RED + "Warning: You try to pass an input sequence where there are not available "
-                                 "repair tokens for creating a replacement. Ignoring this sequence...")
-                return none_tuple
+            replaced_candidate = rng.choice(possible_replacements)
 
             degree_range = len(fluent_tokens) - random_candidate_idx
-            random_degree = random.randrange(0, degree_range)
+            random_degree = rng.randrange(0, degree_range)
 
             # Ensure that the random degree is valid
             if candidates[random_candidate_idx][1] - random_degree < 0:
@@ -302,9 +582,6 @@ class LARD:
             disfluent_tokens = fluent_tokens[:candidates[random_candidate_idx][1]]
             annotations = ["F"] * (candidates[random_candidate_idx][1] - random_degree)
 
-            # Some tokens are returned with "_" so we split them to get the actual tokens
-            replaced_candidate = replaced_candidate.split("_")
-
             # If the last token of the replaced candidate is the same with repair return empty lists
             # (to ensure no conflict with repeats)
             if replaced_candidate[-1].lower() == candidates[random_candidate_idx][0].lower():
@@ -342,7 +619,7 @@ class LARD:
 
             # If we want to add repair cues between RM and RP
             if with_cue:
-                random_repair_cue_idx = randrange(len(REPAIR_CUES))
+                random_repair_cue_idx = rng.randrange(len(REPAIR_CUES))
 
                 disfluent_tokens.append(REPAIR_CUES[random_repair_cue_idx][0])
 
@@ -370,3 +647,225 @@ class LARD:
             return none_tuple
 
         return disfluent_sentence, fluent_tokens, disfluent_tokens, annotations, disfl_type
+
+    def stream_document(self, document, rate=0.2, percentages=None, language='english'):
+        """ Stream the sentences of a document and create disfluencies in some of them.
+        The document is segmented into sentences once and each sentence is tokenized and tagged on its own,
+        so the cost is linear in the length of the document.
+
+        Args:
+            document (`str`): A fluent document, e.g. a call transcript
+
+            rate (`float`, *optional*, defaults to 0.2): The fraction of the sentences of the document
+            with a disfluency.
+
+            percentages (List[`int`], *optional*, defaults to 'None'): The percentages of repetitions, restarts and
+            replacements. All the values must sum to 100. If it is not specified, the default value is set to
+            [50, 25, 25].
+
+            language (`str`, *optional*, defaults to 'english'): The language of the punkt sentence tokenizer.
+
+        Yields:
+            start (`int`), end (`int`), disfl_type (`str`), result (`tuple`): The character offsets of each sentence
+            in the document, the type of the disfluency and the result of the corresponding LARD method
+            (None for the sentences without a disfluency). With overflow='truncate', the sentences with more than
+            max_tokens tokens are not truncated but skipped (and counted as max_tokens), so that the disfluent
+            document keeps their full text.
+        """
+        if not 0 <= rate <= 1:
+            raise ValueError("The rate must be between 0 and 1.")
+        if percentages is None:
+            percentages = DOCUMENT_PERC
+        if sum(percentages) != 100:
+            raise ValueError("The sum of percentages must be 100.")
+        if len(percentages) != len(DOCUMENT_TYPES):
+            raise ValueError("A list with length " + str(len(percentages)) + " is passed. You have to input a list "
+                                                                              "with length 3.")
+
+        spans = sentence_spans(document, language)
+        selected = set(self.rng.sample(range(len(spans)), round(rate * len(spans))))
+
+        for idx, (start, end) in enumerate(spans):
+            if idx not in selected:
+                yield start, end, None, None
+                continue
+
+            sentence = document[start:end]
+            disfl_type = self.rng.choices(DOCUMENT_TYPES, weights=percentages)[0]
+
+            # A truncated sentence would drop its tail from the document, so a long sentence is kept fluent
+            if self.overflow == 'truncate' and self._exceeds_max_tokens(sentence):
+                yield start, end, disfl_type, self._skip_long()
+                continue
+
+            if disfl_type == 'repetition':
+                result = self.create_repetitions(sentence, self.rng.randint(1, 3))
+            elif disfl_type == 'restart':
+                if len(spans) < 2:
+                    print("Warning! For creating a restart, we need a document with 2 or more sentences. "
+                          "Ignoring this sequence...")
+                    result = none_tuple
+                else:
+                    # The restarted sentence is another sentence of the document
+                    partner_idx = self.rng.randrange(len(spans) - 1)
+                    partner_idx += partner_idx >= idx
+                    result = self.create_restarts(document[spans[partner_idx][0]:spans[partner_idx][1]], sentence)
+            else:
+                result = self.create_replacements(sentence)
+
+            yield start, end, disfl_type, result
+
+    def create_document(self, document, rate=0.2, percentages=None, language='english'):
+        """ Create disfluencies in a fraction of the sentences of a document.
+
+        Args:
+            The same with stream_document
+
+        Returns:
+            disfluent_document (`str`): The document with the disfluent sentences. The text between the sentences
+            is kept as is.
+
+            disfluencies (List[`dict`]): For each created disfluency, the character offsets of its sentence in the
+            document (start, end) and in the disfluent document (disfluent_start, disfluent_end), the character
+            offsets of the fluent tokens in the document (token_offsets, None for the tokens that cannot be
+            aligned), the type, the subtype (the part of speech and the cue of a replacement, e.g. noun_with_cue, as
+            in the disfl_type column of create_dataset) and the result of the corresponding LARD method
+        """
+        pieces = []
+        disfluencies = []
+        position = 0
+        shift = 0
+
+        for start, end, disfl_type, result in self.stream_document(document, rate, percentages, language):
+            if result is None or result[0] is None:
+                continue
+
+            disfluent_sentence, fluent_tokens, disfluent_tokens, annotations, subtype = result
+            pieces.append(document[position:start])
+            pieces.append(disfluent_sentence)
+
+            token_offsets = [(start + offsets[0], start + offsets[1]) if offsets is not None else None
+                             for offsets in align_token_offsets(document[start:end], fluent_tokens)]
+
+            disfluencies.append({'start': start,
+                                 'end': end,
+                                 'disfluent_start': start + shift,
+                                 'disfluent_end': start + shift + len(disfluent_sentence),
+                                 'token_offsets': token_offsets,
+                                 'disfl_type': disfl_type,
+                                 'subtype': subtype if disfl_type == 'replacement' else disfl_type,
+                                 'degree': subtype if disfl_type == 'repetition' else 'N/A',
+                                 'disfluent_sentence': disfluent_sentence,
+                                 'fluent_tokens': fluent_tokens,
+                                 'disfluent_tokens': disfluent_tokens,
+                                 'annotations': annotations})
+
+            shift += len(disfluent_sentence) - (end - start)
+            position = end
+
+        pieces.append(document[position:])
+
+        return "".join(pieces), disfluencies
+
+    def generate_batch(self, method, args_list, executor=None, threads=None):
+        """ Call a LARD method once for every tuple of arguments, in a pool of threads.
+        Every call draws from its own random generator, that is derived from the random generator of LARD and the
+        position of the call in the batch. The results are therefore the same with any number of threads and any
+        scheduling, and the instance can be shared between threads.
+
+        Args:
+            method (`str`): The LARD method to call (create_repetitions, create_restarts or create_replacements)
+
+            args_list (List[`tuple`]): The arguments of each call
+
+            executor (`concurrent.futures.ThreadPoolExecutor`, *optional*, defaults to 'None'): The thread pool
+            to run the calls in.
+
+            threads (`int`, *optional*, defaults to 'None'): If no executor is specified, the number of threads of
+            a pool that is created for the batch. If neither is specified, the calls run in the current thread.
+
+        Returns:
+            results (List[`tuple`]): The result of each call, in the order of args_list
+        """
+        if method not in ('create_repetitions', 'create_restarts', 'create_replacements'):
+            raise ValueError("Unsupported method " + str(method) + ".")
+
+        function = getattr(self, method)
+        batch_seed = str(self.rng.getrandbits(64)) + ":"
+
+        def call(idx, args):
+            return function(*args, rng=random.Random(batch_seed + str(idx)))
+
+        if executor is None and threads is None:
+            return [call(idx, args) for idx, args in enumerate(args_list)]
+
+        if executor is None:
+            with ThreadPoolExecutor(threads) as pool:
+                return list(pool.map(call, range(len(args_list)), args_list))
+        return list(executor.map(call, range(len(args_list)), args_list))
+
+    async def _offload(self, method, *args):
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+
+        # Every call gets its own random generator, drawn here: a process executor receives a copy of LARD,
+        # whose random generator would be in the same state for every call
+        rng = random.Random(self.rng.getrandbits(64))
+
+        async with self._semaphores[loop]:
+            if isinstance(self.executor, ProcessPoolExecutor):
+                result, counts = await loop.run_in_executor(self.executor,
+                                                            functools.partial(_call_counted, self, method, args, rng))
+                self.merge_guard_counts(counts)
+                return result
+            return await loop.run_in_executor(self.executor, functools.partial(getattr(self, method), *args, rng=rng))
+
+    async def acreate_repetitions(self, fluent_sentence, degree=None):
+        """ Async counterpart of create_repetitions, that runs in the executor of LARD. """
+        return await self._offload('create_repetitions', fluent_sentence, degree)
+
+    async def acreate_restarts(self, fluent_sentence_1, fluent_sentence_2):
+        """ Async counterpart of create_restarts, that runs in the executor of LARD. """
+        return await self._offload('create_restarts', fluent_sentence_1, fluent_sentence_2)
+
+    async def acreate_replacements(self, fluent_sentence, candidate_pos=None, with_cue=True):
+        """ Async counterpart of create_replacements, that runs in the executor of LARD. """
+        return await self._offload('create_replacements', fluent_sentence, candidate_pos, with_cue)
+
+    async def agenerate(self, method, args_list):
+        """ Generate disfluencies for a stream of inputs in the executor of LARD.
+        At most max_in_flight inputs are processed at the same time and the results are yielded in the input order.
+
+        Args:
+            method (`str`): The LARD method to call (create_repetitions, create_restarts or create_replacements)
+
+            args_list (Iterable or AsyncIterable of `tuple`): The arguments of each call
+
+        Yields:
+            The result of each call, in the order of args_list
+        """
+        if method not in ('create_repetitions', 'create_restarts', 'create_replacements'):
+            raise ValueError("Unsupported method " + str(method) + ".")
+
+        in_flight = collections.deque()
+
+        async def args_stream():
+            if hasattr(args_list, '__aiter__'):
+                async for args in args_list:
+                    yield args
+            else:
+                for args in args_list:
+                    yield args
+
+        try:
+            async for args in args_stream():
+                in_flight.append(asyncio.ensure_future(self._offload(method, *args)))
+                if len(in_flight) >= self.max_in_flight:
+                    yield await in_flight.popleft()
+
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
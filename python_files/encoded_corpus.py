@@ -0,0 +1,220 @@
+import math
+import random
+import string
+import sys
+
+import nltk
+import numpy as np
+
+from python_files.utils import none_tuple
+
+DEGREES = (1, 2, 3)
+
+
+class EncodedCorpus:
+    """ Integer-encoded corpus for array-based generation.
+    Every sentence is tokenized once. The tokens are stored as int32 ids of a shared vocabulary in a single array,
+    with the start of each sentence in an offsets array (CSR-style). The repetitions, the restarts and the fluencies
+    are created on the token ids, and the tokens are decoded back to strings only when the result is returned.
+    The results are the same with the LARD methods (with the same state of the random generator).
+    """
+
+    def __init__(self, vocab, ids, offsets, text_hashes=None, rng=None, skipped=None):
+        """
+        Args:
+            vocab (List[`str`]): The tokens of the vocabulary.
+
+            ids (`np.ndarray`): The int32 token ids of all the sentences.
+
+            offsets (`np.ndarray`): The int64 start of each sentence in ids, followed by the length of ids.
+
+            text_hashes (`np.ndarray`, *optional*, defaults to 'None'): The hash of the text of each sentence,
+            to tell apart sentences with the same tokens but a different text.
+
+            rng (`random.Random`, *optional*, defaults to 'None'): The random generator of the corpus, e.g. the
+            generator of a LARD instance. If it is not specified, a new generator is created.
+
+            skipped (`np.ndarray`, *optional*, defaults to 'None'): Whether each sentence was skipped by the
+            tokenizer, to tell it apart from a sentence without tokens. If it is not specified, no sentence is skipped.
+        """
+        self.vocab = vocab
+        self.ids = ids
+        self.offsets = offsets
+        self.text_hashes = text_hashes
+        self.skipped = skipped
+        self.rng = rng if rng is not None else random.Random()
+
+        # Token-level properties, computed once per vocabulary entry
+        self.is_punctuation = np.array([token in string.punctuation for token in vocab], dtype=bool)
+        lowercase = {}
+        self.lowercase_ids = np.array([lowercase.setdefault(token.lower(), len(lowercase)) for token in vocab],
+                                      dtype=np.int32)
+
+        # For each degree, whether the window of degree tokens that starts at each position has no punctuation
+        self._windows = {}
+
+    @classmethod
+    def from_sentences(cls, sentences, tokenize=None, rng=None):
+        """ Tokenize and encode a list of sentences.
+
+        Args:
+            sentences (Iterable[`str`]): The fluent sentences.
+
+            tokenize (`callable`, *optional*, defaults to 'None'): The tokenizer. If it is not specified,
+            nltk.word_tokenize is used, as in LARD. A sentence for which it returns None (e.g. a sentence skipped by
+            LARD.tokenize_within_budget) is encoded without tokens and marked as skipped, and no disfluency is created
+            from it.
+
+            rng (`random.Random`, *optional*, defaults to 'None'): The random generator of the corpus.
+        """
+        if tokenize is None:
+            tokenize = nltk.word_tokenize
+
+        token_ids = {}
+        ids = []
+        offsets = [0]
+        text_hashes = []
+        skipped = []
+        for sentence in sentences:
+            tokens = tokenize(sentence) if sentence else []
+            skipped.append(tokens is None)
+            if tokens is None:
+                tokens = []
+            ids.extend(token_ids.setdefault(token, len(token_ids)) for token in tokens)
+            offsets.append(len(ids))
+            text_hashes.append(hash(sentence))
+
+        return cls(list(token_ids), np.array(ids, dtype=np.int32), np.array(offsets, dtype=np.int64),
+                   np.array(text_hashes, dtype=np.int64), rng, np.array(skipped, dtype=bool))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        """ The memory of the token ids, the offsets and the vocabulary, in bytes. """
+        return self.ids.nbytes + self.offsets.nbytes + sys.getsizeof(self.vocab) \
+            + sum(sys.getsizeof(token) for token in self.vocab) \
+            + (self.text_hashes.nbytes if self.text_hashes is not None else 0) \
+            + (self.skipped.nbytes if self.skipped is not None else 0)
+
+    def row(self, row):
+        """ The token ids of a sentence. """
+        return self.ids[self.offsets[row]:self.offsets[row + 1]]
+
+    def decode(self, ids):
+        vocab = self.vocab
+        return [vocab[token_id] for token_id in ids.tolist()]
+
+    def tokens(self, row):
+        return self.decode(self.row(row))
+
+    def is_skipped(self, row):
+        """ Whether the sentence was skipped by the tokenizer (e.g. by max_tokens), unlike a sentence without
+        tokens.
+        """
+        return self.skipped is not None and bool(self.skipped[row])
+
+    def same_text(self, row_1, row_2):
+        if self.text_hashes is None:
+            return np.array_equal(self.row(row_1), self.row(row_2))
+        return self.text_hashes[row_1] == self.text_hashes[row_2]
+
+    def sample_row(self, rng=None):
+        """ Draw a random row, like LineIndex.sample. """
+        return (rng if rng is not None else self.rng).randrange(len(self))
+
+    def _window(self, degree):
+        if degree not in self._windows:
+            allowed = ~self.is_punctuation[self.ids]
+            window = allowed.copy()
+            for shift in range(1, degree):
+                window[:-shift] &= allowed[shift:]
+            self._windows[degree] = window
+        return self._windows[degree]
+
+    def create_repetitions(self, row, degree, rng=None):
+        """ Create a repetition of a sentence of the corpus, as LARD.create_repetitions.
+
+        Args:
+            row (`int`): The row of the sentence.
+
+            degree (`int`): The degree of the repetition (1,2 or 3).
+
+            rng (`random.Random`, *optional*, defaults to 'None'): The random generator of the call. If it is not
+            specified, the random generator of the corpus is used.
+
+        Returns:
+            The same with LARD.create_repetitions
+        """
+        if rng is None:
+            rng = self.rng
+        if degree not in DEGREES:
+            raise ValueError("The degree of a repetition must be 1, 2 or 3.")
+
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        length = end - start
+        fluent_ids = self.ids[start:end]
+
+        if length == 1:
+            fluent_tokens = self.decode(fluent_ids)
+            disfluent_tokens = fluent_tokens * 2
+            return " ".join(disfluent_tokens), fluent_tokens, disfluent_tokens, ['D', 'F'], 1
+        if length == 2 and degree > 2:
+            degree = rng.randint(1, 2)
+        if length - degree + 1 <= 0:
+            return none_tuple
+
+        candidates = np.flatnonzero(self._window(degree)[start:end - degree + 1])
+        if len(candidates) == 0:
+            return none_tuple
+        repeat_idx = rng.choice(candidates.tolist())
+
+        # Decode the tokens of the result
+        fluent_tokens = self.decode(fluent_ids)
+        disfluent_tokens = fluent_tokens[:repeat_idx + degree] + fluent_tokens[repeat_idx:]
+        annotations = ["F"] * repeat_idx + ["D"] * degree + ["F"] * (length - repeat_idx)
+
+        return " ".join(disfluent_tokens), fluent_tokens, disfluent_tokens, annotations, degree
+
+    def create_restarts(self, row_1, row_2, rng=None):
+        """ Create a restart from two sentences of the corpus, as LARD.create_restarts.
+
+        Args:
+            row_1 (`int`): The row of the sentence that is restarted.
+
+            row_2 (`int`): The row of the fluent sentence.
+
+            rng (`random.Random`, *optional*, defaults to 'None'): The random generator of the call. If it is not
+            specified, the random generator of the corpus is used.
+
+        Returns:
+            The same with LARD.create_restarts
+        """
+        if rng is None:
+            rng = self.rng
+
+        ids_1 = self.row(row_1)
+        ids_2 = self.row(row_2)
+
+        if len(ids_1) < 4 or len(ids_2) < 4:
+            return none_tuple
+
+        location_idx = rng.randrange(2, math.ceil(len(ids_1) / 2) + 2)
+
+        # Same beginning, that would create a repetition instead of a restart
+        prefix = min(location_idx, len(ids_2))
+        if np.array_equal(ids_1[:prefix], ids_2[:prefix]):
+            return none_tuple
+
+        # Same first token or consecutive same tokens
+        first_id = self.lowercase_ids[ids_2[0]]
+        if self.lowercase_ids[ids_1[0]] == first_id or self.lowercase_ids[ids_1[location_idx - 1]] == first_id:
+            return none_tuple
+
+        # Decode the tokens of the result
+        fluent_tokens = self.decode(ids_2)
+        disfluent_tokens = self.decode(ids_1[:location_idx]) + fluent_tokens
+        annotations = ["D"] * location_idx + ["F"] * len(fluent_tokens)
+
+        return " ".join(disfluent_tokens), fluent_tokens, disfluent_tokens, annotations, 'restart'
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+from colorama import Fore
+
+from python_files.create_dataset import create_disfluencies, read_fluent_data, subtype_fractions, CHUNK_SIZE, \
+    OUTPUT_NAMES
+from python_files.disfluency_generation import LARD
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def row_keys(texts):
+    """ Content keys of the input rows: the hash of the text and the occurrence of the same text in the input,
+    so that duplicate rows get different keys.
+    """
+    occurrences = {}
+    keys = []
+    for text in texts:
+        digest = hashlib.sha1(str(text).encode("utf-8")).hexdigest()[:16]
+        occurrences[digest] = occurrences.get(digest, 0) + 1
+        keys.append(digest + ":" + str(occurrences[digest] - 1))
+    return keys
+
+
+def assign_subtypes(n_rows, fractions, counts):
+    """ Assign new rows to disfluency subtypes, so that the totals (with the already assigned rows) follow the
+    fractions as closely as possible. Each row goes to the subtype with the largest deficit.
+
+    Args:
+        n_rows (`int`): The number of new rows.
+
+        fractions (`dict`): The target fraction of each subtype.
+
+        counts (`dict`): The number of rows already assigned to each subtype. It is updated in place.
+
+    Returns:
+        assignments (List[`str`]): The subtype of each new row
+    """
+    total = sum(counts.values()) + n_rows
+    assignments = []
+    for _ in range(n_rows):
+        subtype = max(fractions, key=lambda name: fractions[name] * total - counts.get(name, 0))
+        counts[subtype] = counts.get(subtype, 0) + 1
+        assignments.append(subtype)
+    return assignments
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def output_paths(output_dir):
+    """ The output files of the incremental dataset: one per disfluency type and the final file. """
+    paths = {disfl_type: os.path.join(output_dir, name + ".csv") for disfl_type, name in OUTPUT_NAMES.items()}
+    paths['final'] = os.path.join(output_dir, "final_disfluent_set.csv")
+    return paths
+
+
+def rewrite_output(path, keep_row, frame=None):
+    """ Rewrite an output file in chunks through a temporary file, keeping the rows for which keep_row(row_key) is
+    True and appending the rows of frame. The file is replaced with os.replace, so it is never left half-written.
+    """
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    tmp_path = path + ".tmp"
+    pd.DataFrame(columns=columns).to_csv(tmp_path, index=False)
+    # The values are copied as they are written (e.g. N/A is not read as a missing value)
+    for chunk in pd.read_csv(path, chunksize=CHUNK_SIZE, dtype=str, keep_default_na=False):
+        chunk[chunk['row_key'].map(keep_row)].to_csv(tmp_path, mode="a", header=False, index=False)
+    if frame is not None and len(frame) != 0:
+        frame.reindex(columns=columns).to_csv(tmp_path, mode="a", header=False, index=False)
+    os.replace(tmp_path, path)
+
+
+def recover_output(path, committed_size, committed_keys):
+    """ Drop the rows that a run which did not save its manifest (e.g. it was interrupted) wrote to an output file.
+    The manifest records the size of each output file when it was saved, so a different size means uncommitted rows.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == committed_size:
+        return
+    print(Fore.RED + "Warning! " + path + " was changed after the manifest was saved. Dropping the rows that are "
+                                          "not in the manifest...")
+    if committed_size is None:
+        os.remove(path)
+    else:
+        rewrite_output(path, lambda key: key in committed_keys)
+
+
+def update_output(path, deleted_keys, frame, overwrite=False):
+    """ Drop the rows of the deleted keys from an output file and append the new rows to it.
+    The file is rewritten (through a temporary file) only when some of its rows are deleted, otherwise the new rows
+    are appended in place.
+    """
+    if overwrite and os.path.exists(path):
+        # The first run replaces the previous outputs, also when it creates no rows
+        os.remove(path)
+
+    if not os.path.exists(path):
+        if len(frame) != 0:
+            frame.to_csv(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+    elif deleted_keys:
+        rewrite_output(path, lambda key: key not in deleted_keys, frame)
+    elif len(frame) != 0:
+        columns = list(pd.read_csv(path, nrows=0).columns)
+        frame.reindex(columns=columns).to_csv(path, mode="a", header=False, index=False)
+
+
+def create_dataset_incremental(input_file_path,
+                               column_text,
+                               output_dir,
+                               keep_fluent=False,
+                               percentages=None,
+                               percentages_with_fluent=None,
+                               repetition_degrees_percentage=None,
+                               replacement_types_percentage=None,
+                               create_all_files=True,
+                               concat_files=True,
+                               seed=0,
+                               tolerance=1.0):
+    """
+    This function is used to keep the dataset of create_dataset up to date with an input file that changes over time,
+    without regenerating all of it. A manifest (manifest.json in output_dir) records the content hash and the
+    disfluency subtype of every input row along with the seed. On each run, disfluencies are created only for the
+    new rows, the outputs of the deleted rows are dropped and the new outputs are appended to the existing files.
+    The manifest is saved last, with the sizes of the output files, so the rows of an interrupted run are dropped
+    by the next run.
+
+    Args:
+            input_file_path, column_text, keep_fluent, percentages, percentages_with_fluent,
+            repetition_degrees_percentage, replacement_types_percentage, create_all_files, concat_files:
+            The same with create_dataset. The percentages must not change between runs.
+
+            output_dir (`str`): The directory of the created files and of the manifest.
+
+            seed (`int`, *optional*, defaults to 0): The seed of the first run. Each run is seeded with the seed and
+            the number of previous runs.
+
+            tolerance (`float`, *optional*, defaults to 1.0): The maximum difference, in percentage points, between
+            the percentage of rows assigned to each subtype and the requested percentage. A warning is printed if it
+            is exceeded (e.g. when many rows of a subtype are deleted).
+
+    Returns:
+            summary (`dict`): The number of new, deleted and kept rows of the run
+    """
+    fractions = subtype_fractions(keep_fluent, percentages, percentages_with_fluent,
+                                  repetition_degrees_percentage, replacement_types_percentage)
+
+    fluent_data, column_text, line_index = read_fluent_data(input_file_path, column_text)
+    if line_index is not None:
+        line_index.close()
+
+    keys = row_keys(fluent_data[column_text])
+    fluent_data['row_key'] = keys
+
+    manifest = load_manifest(output_dir)
+    target = {name: fraction for name, (fraction, _) in fractions.items()}
+    # The first run replaces any previous outputs, like create_dataset
+    first_run = manifest is None
+    if first_run:
+        manifest = {'version': MANIFEST_VERSION, 'seed': seed, 'runs': 0, 'fractions': target, 'rows': {}}
+    else:
+        if manifest['fractions'].keys() != target.keys() or \
+                any(abs(manifest['fractions'][name] - target[name]) > 1e-9 for name in target):
+            raise ValueError("The percentages are different from the percentages of the manifest. "
+                             "Remove the manifest to regenerate the whole dataset.")
+        seed = manifest['seed']
+
+    assigned = manifest['rows']
+    paths = output_paths(output_dir)
+    if not first_run and 'sizes' in manifest:
+        committed_keys = set(assigned)
+        for name, path in paths.items():
+            recover_output(path, manifest['sizes'].get(name), committed_keys)
+
+    key_set = set(keys)
+    deleted_keys = [key for key in assigned if key not in key_set]
+    # Only the output files of the types of the deleted rows (and the final file) are rewritten
+    deleted_by_type = {disfl_type: set() for disfl_type in OUTPUT_NAMES}
+    for key in deleted_keys:
+        subtype = assigned[key]
+        if subtype in fractions:
+            deleted_by_type[fractions[subtype][1]['disfl_type']].add(key)
+    new_data = fluent_data[~fluent_data['row_key'].isin(assigned.keys())]
+
+    print("New rows: " + str(len(new_data)))
+    print("Deleted rows: " + str(len(deleted_keys)))
+
+    for key in deleted_keys:
+        del assigned[key]
+
+    counts = {}
+    for subtype in assigned.values():
+        counts[subtype] = counts.get(subtype, 0) + 1
+
+    # Shuffle the new rows, so that the assignment does not follow the order of the input
+    generator = LARD(seed=seed + manifest['runs'])
+    order = list(range(len(new_data)))
+    generator.rng.shuffle(order)
+    new_data = new_data.iloc[order]
+
+    assignments = assign_subtypes(len(new_data), target, counts)
+    new_data = new_data.assign(subtype=assignments)
+
+    # Partners of the new restarts are drawn from the whole input
+    all_texts = fluent_data[column_text].values.tolist()
+    partner_sampler = lambda: generator.rng.choice(all_texts)
+
+    created = {disfl_type: [] for disfl_type in OUTPUT_NAMES}
+    for subtype, (_, kwargs) in fractions.items():
+        subset = new_data[new_data['subtype'] == subtype].drop(columns='subtype')
+        if len(subset) == 0:
+            continue
+        print("Creating " + subtype + " (" + str(len(subset)) + " rows)...")
+        kwargs = dict(kwargs)
+        disfl_type = kwargs.pop('disfl_type')
+        created[disfl_type].append(create_disfluencies(subset.copy(), column_text, disfl_type,
+                                                       partner_sampler=partner_sampler, generator=generator,
+                                                       **kwargs))
+
+    frames = {disfl_type: pd.concat(frames) if frames else pd.DataFrame()
+              for disfl_type, frames in created.items()}
+
+    if create_all_files:
+        for disfl_type, frame in frames.items():
+            update_output(paths[disfl_type], deleted_by_type[disfl_type], frame, first_run)
+    if concat_files:
+        update_output(paths['final'], set(deleted_keys), pd.concat(list(frames.values())), first_run)
+
+    # The manifest is saved after the outputs: it commits the run
+    assigned.update(zip(new_data['row_key'], assignments))
+    manifest['runs'] += 1
+    manifest['sizes'] = {name: os.path.getsize(path) for name, path in paths.items() if os.path.exists(path)}
+    save_manifest(output_dir, manifest)
+
+    total = len(assigned)
+    for name, fraction in target.items():
+        percentage = 100 * counts.get(name, 0) / total if total else 0.0
+        if abs(percentage - 100 * fraction) > tolerance:
+            print(Fore.RED + "Warning! " + name + " rows are " + "{:.2f}".format(percentage) + "% of the dataset "
+                  "instead of " + "{:.2f}".format(100 * fraction) + "%.")
+
+    print(Fore.GREEN + u'\u2713' + " Incremental update completed")
+
+    return {'new_rows': len(new_data),
+            'deleted_rows': len(deleted_keys),
+            'kept_rows': sum(len(frame) for frame in frames.values()),
+            'total_rows': total}
@@ -0,0 +1,112 @@
+import queue
+import threading
+
+import pandas as pd
+
+from python_files.line_index import LineIndex
+
+SUPPORTED_FORMATS = (".csv", ".txt")
+
+# The maximum number of chunks read ahead of the generation
+QUEUE_SIZE = 4
+
+
+class InputReader:
+    """ Background reader of the input of create_dataset.
+    A reader thread reads the input in chunks (read_csv with chunksize for .csv files, the line index for .txt files)
+    and passes them through a bounded queue, so that the next chunks are read while the current one is generated and
+    only a few chunks are in memory at a time. The chunks are indexed by the positions of their rows in the input.
+    """
+
+    def __init__(self, input_file_path, column_text=None, chunk_size=1000, queue_size=QUEUE_SIZE, line_index=None):
+        """
+        Args:
+            input_file_path (`str`): The .csv or .txt input file.
+
+            column_text (`str`, *optional*, defaults to 'None'): The text column. It is required for .csv files and
+            defaults to 'text' for .txt files.
+
+            chunk_size (`int`, *optional*, defaults to 1000): The number of rows of a chunk.
+
+            queue_size (`int`, *optional*, defaults to 4): The maximum number of chunks waiting to be generated.
+            When the queue is full, the reader waits for the generation.
+
+            line_index (`LineIndex`, *optional*, defaults to 'None'): The line index of a .txt file. If it is not
+            specified, it is opened (and built, if needed) by the reader.
+        """
+        if not input_file_path.lower().endswith(SUPPORTED_FORMATS):
+            raise ValueError("You have to input a supported format input file. Supported formats: .csv or .txt")
+
+        self.input_file_path = input_file_path
+        self.is_text = input_file_path.lower().endswith(".txt")
+        if column_text is None:
+            if not self.is_text:
+                raise ValueError("You have to specify text column.")
+            column_text = 'text'
+        self.column_text = column_text
+        self.chunk_size = chunk_size
+
+        self._own_index = self.is_text and line_index is None
+        self.line_index = LineIndex(input_file_path) if self._own_index else line_index
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def __iter__(self):
+        if self._thread.ident is None:
+            self.start()
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def texts(self):
+        """ Iterate over the texts of the input rows. """
+        for chunk in self:
+            yield from chunk[self.column_text]
+
+    def close(self):
+        """ Stop the reader, e.g. when the generation fails, and close the line index that it opened. """
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if self._own_index:
+            self.line_index.close()
+
+    def _chunks(self):
+        if self.is_text:
+            for first in range(0, len(self.line_index), self.chunk_size):
+                stop = min(first + self.chunk_size, len(self.line_index))
+                yield pd.DataFrame({self.column_text: list(self.line_index.lines(first, stop))},
+                                   index=pd.RangeIndex(first, stop))
+        else:
+            first = 0
+            for chunk in pd.read_csv(self.input_file_path, chunksize=self.chunk_size):
+                chunk.index = pd.RangeIndex(first, first + len(chunk))
+                first += len(chunk)
+                yield chunk
+
+    def _run(self):
+        try:
+            for chunk in self._chunks():
+                if self._stop.is_set():
+                    return
+                self._queue.put(chunk)
+        except Exception as e:
+            self._error = e
+        finally:
+            if not self._stop.is_set():
+                self._queue.put(None)
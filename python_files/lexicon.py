@@ -0,0 +1,291 @@
+import argparse
+import json
+import mmap
+import struct
+import zlib
+
+import nltk
+from colorama import Fore
+
+from python_files.utils import extract_syns_ants
+
+LEXICON_MAGIC = b"LARDLEX1"
+LEXICON_POS = {'NOUN': 'n', 'VERB': 'v', 'ADJ': 'a'}
+
+# Header: magic, number of buckets, number of records, length of the json metadata block
+_HEADER = struct.Struct("<8sIIQ")
+_OFFSET = struct.Struct("<Q")
+
+# Separators used inside a bucket. WordNet lemma names never contain ASCII control characters.
+_RECORD_SEP = "\x1c"
+_FIELD_SEP = "\x1d"
+_ITEM_SEP = "\x1e"
+_TOKEN_SEP = "\x1f"
+
+
+def _bucket_of(key, n_buckets):
+    return zlib.crc32(key.encode("utf-8")) & (n_buckets - 1)
+
+
+def _encode_replacements(replacements):
+    return _ITEM_SEP.join(_TOKEN_SEP.join(tokens) for tokens in replacements)
+
+
+def _decode_replacements(field):
+    if not field:
+        return []
+    return [item.split(_TOKEN_SEP) for item in field.split(_ITEM_SEP)]
+
+
+def _filter_self(word, replacements):
+    # Keep the positions of the self-matches, so that they can be restored for inflected candidates
+    kept = []
+    self_positions = []
+    for idx, replacement in enumerate(replacements):
+        if replacement.lower() == word:
+            self_positions.append(str(idx) + _TOKEN_SEP + replacement)
+        else:
+            kept.append(replacement.split("_"))
+    return kept, self_positions
+
+
+def _has_iterative_morphy(wordnet):
+    # nltk<=3.5 applies the substitution rules until a lemma is found ("churcheses" -> "churches" -> "church"),
+    # the later versions apply them only once
+    return bool(wordnet._morphy("churcheses", "n"))
+
+
+def build_lexicon(output_path, pos_list=None):
+    """ Build the replacement lexicon.
+    This function is used to precompile, for every WordNet lemma, the synonyms and antonyms that
+    create_replacements needs into a compact binary file, that can be memory-mapped by LARD.
+
+    Args:
+        output_path (`str`): The path of the binary lexicon file to create.
+
+        pos_list (List[`str`], *optional*, defaults to 'None'): The parts of speech to compile. Supported values
+        NOUN, VERB, ADJ. If it is not specified, all the supported parts of speech are compiled.
+
+    The morphological processing of WordNet differs between nltk versions, so the version of nltk and its
+    processing are recorded in the lexicon, which reproduces them and warns when it is opened with another version.
+
+    Returns:
+        n_records (`int`): The number of records written to the lexicon
+    """
+    from nltk.corpus import wordnet
+
+    if pos_list is None:
+        pos_list = list(LEXICON_POS)
+
+    records = {}
+    metadata = {'substitutions': {}, 'nltk_version': nltk.__version__,
+                'iterative_morphy': _has_iterative_morphy(wordnet)}
+
+    for candidate_pos in pos_list:
+        if candidate_pos not in LEXICON_POS:
+            raise ValueError("You need to specify a valid POS identifier. Supported POS: NOUN, VERB or ADJ")
+        wn_pos = LEXICON_POS[candidate_pos]
+        metadata['substitutions'][candidate_pos] = wordnet.MORPHOLOGICAL_SUBSTITUTIONS[wn_pos]
+
+        print("Compiling " + candidate_pos.lower() + " lexicon...")
+        for lemma in wordnet.all_lemma_names(pos=wn_pos):
+            # Look up the exact lemma (without morphological processing), as create_replacements
+            # resolves the inflected forms at runtime
+            synsets = [wordnet.synset_from_pos_and_offset(wn_pos, offset)
+                       for offset in wordnet._lemma_pos_offset_map[lemma].get(wn_pos, [])]
+            synonyms = [l.name() for synset in synsets for l in synset.lemmas()]
+            antonyms = [l.antonyms()[0].name() for synset in synsets for l in synset.lemmas() if l.antonyms()]
+
+            synonyms, synonym_self = _filter_self(lemma, synonyms)
+            antonyms, antonym_self = _filter_self(lemma, antonyms)
+
+            record = records.setdefault((candidate_pos, lemma), [False, [], [], [], [], []])
+            record[0] = True
+            record[2], record[3], record[4], record[5] = synonyms, antonyms, synonym_self, antonym_self
+
+        for form, lemmas in wordnet._exception_map[wn_pos].items():
+            record = records.setdefault((candidate_pos, form), [False, [], [], [], [], []])
+            record[1] = lemmas
+
+    n_buckets = 1
+    while n_buckets < len(records):
+        n_buckets *= 2
+
+    buckets = [[] for _ in range(n_buckets)]
+    for (candidate_pos, word), (is_lemma, exceptions, synonyms, antonyms, synonym_self, antonym_self) in \
+            records.items():
+        key = candidate_pos + ":" + word
+        buckets[_bucket_of(key, n_buckets)].append(_FIELD_SEP.join([
+            key,
+            "1" if is_lemma else "0",
+            _ITEM_SEP.join(exceptions),
+            _encode_replacements(synonyms),
+            _encode_replacements(antonyms),
+            _ITEM_SEP.join(synonym_self),
+            _ITEM_SEP.join(antonym_self)]))
+
+    meta_block = json.dumps(metadata).encode("utf-8")
+    data_blocks = [_RECORD_SEP.join(bucket).encode("utf-8") for bucket in buckets]
+
+    with open(output_path, "wb") as f:
+        f.write(_HEADER.pack(LEXICON_MAGIC, n_buckets, len(records), len(meta_block)))
+        f.write(meta_block)
+        offset = 0
+        for block in data_blocks:
+            f.write(_OFFSET.pack(offset))
+            offset += len(block)
+        f.write(_OFFSET.pack(offset))
+        for block in data_blocks:
+            f.write(block)
+
+    return len(records)
+
+
+class Lexicon:
+    """ Read-only, memory-mapped replacement lexicon created by build_lexicon.
+    All the processes that open the same file share a single page-cache copy of it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.n_buckets, self.n_records, meta_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != LEXICON_MAGIC:
+            raise ValueError("The file " + path + " is not a LARD lexicon.")
+
+        meta_start = _HEADER.size
+        metadata = json.loads(self._mm[meta_start:meta_start + meta_len].decode("utf-8"))
+        self._substitutions = {pos: [tuple(rule) for rule in rules]
+                               for pos, rules in metadata['substitutions'].items()}
+        # The lexicons without the metadata were built with nltk==3.5
+        self.nltk_version = metadata.get('nltk_version')
+        self._iterative_morphy = metadata.get('iterative_morphy', True)
+        if self.nltk_version != nltk.__version__:
+            print(Fore.RED + "Warning! The lexicon " + path + " was built with nltk==" + str(self.nltk_version or "3.5")
+                  + ", but nltk==" + nltk.__version__ + " is installed. The replacements may differ from WordNet. "
+                  "Rebuild the lexicon with the installed nltk...")
+
+        self._table_start = meta_start + meta_len
+        self._data_start = self._table_start + (self.n_buckets + 1) * _OFFSET.size
+
+    def __getstate__(self):
+        # The memory map is reopened from the path, e.g. when the lexicon is sent to a worker process
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def _record(self, candidate_pos, word):
+        key = candidate_pos + ":" + word
+        bucket = _bucket_of(key, self.n_buckets)
+        start, = _OFFSET.unpack_from(self._mm, self._table_start + bucket * _OFFSET.size)
+        end, = _OFFSET.unpack_from(self._mm, self._table_start + (bucket + 1) * _OFFSET.size)
+        if start == end:
+            return None
+
+        prefix = key + _FIELD_SEP
+        for record in self._mm[self._data_start + start:self._data_start + end].decode("utf-8").split(_RECORD_SEP):
+            if record.startswith(prefix):
+                return record.split(_FIELD_SEP)[1:]
+        return None
+
+    def _lemma_forms(self, word, candidate_pos):
+        # Same morphological processing with WordNet of the nltk that built the lexicon, using the compiled
+        # exception lists
+        def is_lemma(form):
+            record = self._record(candidate_pos, form)
+            return record is not None and record[0] == "1"
+
+        def apply_rules(forms):
+            return [form[:-len(old)] + new
+                    for form in forms
+                    for old, new in self._substitutions[candidate_pos]
+                    if form.endswith(old)]
+
+        def filter_forms(forms):
+            result = []
+            for form in forms:
+                if form not in result and is_lemma(form):
+                    result.append(form)
+            return result
+
+        record = self._record(candidate_pos, word)
+        if record is not None and record[1]:
+            return filter_forms([word] + record[1].split(_ITEM_SEP))
+
+        forms = apply_rules([word])
+        results = filter_forms([word] + forms)
+        if results or not self._iterative_morphy:
+            return results
+
+        while forms:
+            forms = apply_rules(forms)
+            results = filter_forms(forms)
+            if results:
+                return results
+        return []
+
+    def replacements(self, word, candidate_pos):
+        """ Find the possible replacements of a word.
+
+        Args:
+            word (`str`): The candidate token of the fluent sequence
+
+            candidate_pos (`str`): The part of speech of the candidate (NOUN, VERB or ADJ)
+
+        Returns:
+            replacements (List[List[`str`]]): The synonyms followed by the antonyms of the word, excluding the word
+            itself, with multiword replacements split into tokens
+        """
+        word = word.lower()
+        synonyms = []
+        antonyms = []
+
+        for form in self._lemma_forms(word, candidate_pos):
+            _, _, synonym_field, antonym_field, synonym_self, antonym_self = self._record(candidate_pos, form)
+            form_synonyms = _decode_replacements(synonym_field)
+            form_antonyms = _decode_replacements(antonym_field)
+
+            # An inflected candidate (e.g. "going") can be replaced with its own lemma (e.g. "go")
+            if form != word:
+                for replacements, positions in ((form_synonyms, synonym_self), (form_antonyms, antonym_self)):
+                    for item in (item for item in positions.split(_ITEM_SEP) if item):
+                        idx, replacement = item.split(_TOKEN_SEP)
+                        replacements.insert(int(idx), replacement.split("_"))
+
+            synonyms.extend(form_synonyms)
+            antonyms.extend(form_antonyms)
+
+        return [tokens for tokens in synonyms + antonyms if "_".join(tokens).lower() != word]
+
+
+def check_lexicon(lexicon, words):
+    """ Check that the lexicon returns the same replacements with WordNet for the given (word, pos) pairs.
+
+    Returns:
+        mismatches (List[`tuple`]): The (word, pos) pairs that differ
+    """
+    mismatches = []
+    for word, candidate_pos in words:
+        synonyms, antonyms = extract_syns_ants(word, candidate_pos)
+        expected = [r.split("_") for r in synonyms + antonyms if r.lower() != word.lower()]
+        if lexicon.replacements(word, candidate_pos) != expected:
+            mismatches.append((word, candidate_pos))
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the WordNet replacement lexicon used by LARD.")
+    parser.add_argument("output_path", help="Path of the lexicon file to create")
+    parser.add_argument("--pos", nargs="+", choices=list(LEXICON_POS), default=None,
+                        help="Parts of speech to compile (defaults to NOUN VERB ADJ)")
+    args = parser.parse_args()
+
+    n_records = build_lexicon(args.output_path, args.pos)
+    print("Lexicon with " + str(n_records) + " records saved to " + args.output_path)
@@ -0,0 +1,148 @@
+import json
+import mmap
+import os
+import random
+
+import numpy as np
+
+# Bytes scanned at a time while building the index
+BLOCK_SIZE = 64 * 2 ** 20
+
+
+def index_paths(path):
+    return path + ".idx.npy", path + ".idx.json"
+
+
+def build_line_index(path, block_size=BLOCK_SIZE):
+    """ Build the line-offset index of a plain-text corpus with one utterance per line.
+    The file is scanned once through a memory map. The [start, end) byte offsets of the non-empty lines
+    (without the line endings) are saved next to the corpus (corpus.txt.idx.npy), along with the size and the
+    modification time of the corpus (corpus.txt.idx.json), so that a stale index is rebuilt.
+
+    Args:
+        path (`str`): The path of the .txt corpus.
+
+        block_size (`int`, *optional*, defaults to 64MB): The number of bytes scanned at a time.
+
+    Returns:
+        n_lines (`int`): The number of indexed lines
+    """
+    offsets_path, meta_path = index_paths(path)
+    size = os.path.getsize(path)
+
+    starts = []
+    ends = []
+    if size > 0:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for block_start in range(0, size, block_size):
+                count = min(block_size, size - block_start)
+                block = np.frombuffer(mm, dtype=np.uint8, count=count, offset=block_start)
+                newlines = np.flatnonzero(block == ord("\n")) + block_start
+                ends.append(newlines)
+                starts.append(newlines + 1)
+                del block
+
+        ends = np.concatenate(ends + [np.array([size], dtype=np.int64)])
+        starts = np.concatenate([np.array([0], dtype=np.int64)] + starts)
+
+        # Strip the carriage returns of the \r\n line endings
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            has_cr = (ends > starts) & (data[np.maximum(ends - 1, 0)] == ord("\r"))
+            ends = ends - has_cr
+            del data
+
+        non_empty = ends > starts
+        offsets = np.stack([starts[non_empty], ends[non_empty]], axis=1).astype(np.int64)
+    else:
+        offsets = np.empty((0, 2), dtype=np.int64)
+
+    np.save(offsets_path, offsets)
+    with open(meta_path, "w") as f:
+        json.dump({'size': size, 'mtime_ns': os.stat(path).st_mtime_ns, 'lines': len(offsets)}, f)
+
+    return len(offsets)
+
+
+class LineIndex:
+    """ Random access to the lines of a plain-text corpus through its persisted line-offset index.
+    Neither the corpus nor the index are loaded into memory: the corpus is memory-mapped and the index
+    is opened with np.load(mmap_mode='r').
+    """
+
+    def __init__(self, path, rebuild=False):
+        """
+        Args:
+            path (`str`): The path of the .txt corpus. The index is built if it does not exist or is stale.
+
+            rebuild (`bool`, *optional*, defaults to False): Whether or not to rebuild an existing index.
+        """
+        self.path = path
+        offsets_path, meta_path = index_paths(path)
+
+        if rebuild or not self._is_fresh(meta_path):
+            print("Building line index of " + path + "...")
+            build_line_index(path)
+
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else None
+
+    def _is_fresh(self, meta_path):
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as f:
+            meta = json.load(f)
+        stat = os.stat(self.path)
+        return meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx]
+        return self._mm[start:end].decode("utf-8")
+
+    def __iter__(self):
+        return self.lines()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def lines(self, start=0, stop=None):
+        """ Iterate over the lines [start, stop). """
+        for idx in range(start, len(self) if stop is None else stop):
+            yield self[idx]
+
+    def sample(self, rng=random):
+        """ Draw a random line. """
+        return self[rng.randrange(len(self))]
+
+    def partition(self, n_parts, start=0, stop=None):
+        """ Split the lines [start, stop) of the corpus into n_parts contiguous parts with (almost) the same number
+        of lines.
+
+        Returns:
+            parts (List[`tuple`]): The (first_line, stop_line, byte_start, byte_end) of each part. A worker can
+            read its part with read_range, seeking directly to byte_start.
+        """
+        bounds = np.linspace(start, len(self) if stop is None else stop, n_parts + 1).astype(np.int64)
+        parts = []
+        for first, stop in zip(bounds[:-1], bounds[1:]):
+            if first == stop:
+                continue
+            parts.append((int(first), int(stop), int(self.offsets[first][0]), int(self.offsets[stop - 1][1])))
+        return parts
+
+
+def read_range(path, byte_start, byte_end):
+    """ Read the non-empty lines of a byte range of a corpus (e.g. a part of LineIndex.partition),
+    without the index. The lines are split as in the index, so the n-th line read is the line first_line + n.
+    """
+    with open(path, "rb") as f:
+        f.seek(byte_start)
+        data = f.read(byte_end - byte_start)
+    lines = (line[:-1] if line.endswith(b"\r") else line for line in data.split(b"\n"))
+    return [line.decode("utf-8") for line in lines if line]
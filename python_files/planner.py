@@ -0,0 +1,251 @@
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import math
+import random
+import time
+
+import pandas as pd
+from colorama import Fore
+
+from python_files.create_dataset import count_rows, create_disfluencies, subtype_bounds, subtype_fractions, \
+    CHUNK_SIZE
+from python_files.disfluency_generation import LARD
+from python_files.encoded_corpus import EncodedCorpus
+from python_files.input_reader import QUEUE_SIZE
+from python_files.line_index import LineIndex
+from python_files.progress import format_duration
+from python_files.scale_harness import current_rss_mb
+from python_files.spans import to_span_schema
+
+
+def sample_input(input_file_path, column_text, sample_fraction, rng):
+    """ Sample rows of the input file of create_dataset, without loading the whole file.
+
+    Returns:
+        sample (`pd.DataFrame`), column_text (`str`), n_rows (`int`), row_bytes (`float`): The sampled rows, indexed
+        by their positions in the input, the text column, the number of rows of the input and the average memory of
+        an input row once it is loaded
+    """
+    if input_file_path.lower().endswith(".csv"):
+        if column_text is None:
+            raise ValueError("You have to specify text column.")
+        positions = []
+
+        def skip(idx):
+            # Keep the header and a random fraction of the rows, recording their positions
+            if idx == 0:
+                return False
+            if rng.random() >= sample_fraction:
+                return True
+            positions.append(idx - 1)
+            return False
+
+        sample = pd.read_csv(input_file_path, skiprows=skip)
+        sample.index = positions[:len(sample)]
+        # The callback is also called past the last row, so the rows are counted separately
+        n_rows = count_rows(input_file_path, column_text)
+    elif input_file_path.lower().endswith(".txt"):
+        if column_text is None:
+            column_text = 'text'
+        line_index = LineIndex(input_file_path)
+        n_rows = len(line_index)
+        rows = sorted(rng.sample(range(n_rows), min(n_rows, max(1, round(sample_fraction * n_rows)))))
+        sample = pd.DataFrame({column_text: [line_index[row] for row in rows]}, index=rows)
+        line_index.close()
+    else:
+        raise ValueError("You have to input a supported format input file. Supported formats: .csv or .txt")
+
+    row_bytes = sample.memory_usage(deep=True).sum() / len(sample) if len(sample) else 0.0
+    return sample, column_text, n_rows, row_bytes
+
+
+def corpus_bytes(sample_texts, n_rows, tokenize=None):
+    """ Estimate the memory of the EncodedCorpus of the whole input from an encoded sample. The token ids, the
+    offsets and the per-row arrays grow with the rows, while the vocabulary grows about with the square root of the
+    rows (Heaps' law).
+    """
+    if not sample_texts:
+        return 0
+    corpus = EncodedCorpus.from_sentences(sample_texts, tokenize=tokenize)
+    array_bytes = corpus.ids.nbytes + corpus.offsets.nbytes + corpus.text_hashes.nbytes + corpus.skipped.nbytes
+    vocab_bytes = corpus.nbytes - array_bytes
+    scale = n_rows / len(sample_texts)
+    return int(array_bytes * scale + vocab_bytes * math.sqrt(scale))
+
+
+def plan_dataset(input_file_path,
+                 column_text,
+                 keep_fluent=False,
+                 percentages=None,
+                 percentages_with_fluent=None,
+                 repetition_degrees_percentage=None,
+                 replacement_types_percentage=None,
+                 create_all_files=True,
+                 concat_files=True,
+                 shard_size=None,
+                 encoded=False,
+                 sample_fraction=0.01,
+                 seed=0,
+                 max_tokens=None,
+                 overflow='skip',
+                 time_budget=None,
+                 output_schema='tokens',
+                 print_plan=True):
+    """
+    This function is used to estimate a create_dataset job before running it. A fraction of the input is sampled and
+    the disfluencies of each subtype are created for the sampled rows with the real LARD generators. The yield (rows
+    that are actually created), the rows/sec, the output size and the peak memory of the whole job are extrapolated
+    from the sample. No output is written.
+
+    Args:
+            input_file_path, column_text, keep_fluent, percentages, percentages_with_fluent,
+            repetition_degrees_percentage, replacement_types_percentage, create_all_files, concat_files, shard_size,
+            encoded: The same with create_dataset.
+
+            sample_fraction (`float`, *optional*, defaults to 0.01): The fraction of the input rows to sample.
+
+            seed (`int`, *optional*, defaults to 0): The seed of the sampling and of the generation.
+
+            max_tokens, overflow, time_budget: The guards of the input rows, as in create_dataset. The skipped rows
+            are part of the estimated yield.
+
+            output_schema (`str`, *optional*, defaults to 'tokens'): The schema of the output files, as in
+            create_dataset.
+
+            print_plan (`bool`, *optional*, defaults to True): Whether or not to print the plan.
+
+    Returns:
+            plan (`dict`): The estimated rows, yield, output bytes and duration of each subtype and of the whole job,
+            and the estimated peak memory
+    """
+    if not 0 < sample_fraction <= 1:
+        raise ValueError("The sample fraction must be between 0 and 1.")
+
+    fractions = subtype_fractions(keep_fluent, percentages, percentages_with_fluent,
+                                  repetition_degrees_percentage, replacement_types_percentage)
+
+    rng = random.Random(seed)
+    sample, column_text, n_rows, row_bytes = sample_input(input_file_path, column_text, sample_fraction, rng)
+
+    # The sampled rows belong to the subtypes that create_dataset assigns their positions to
+    bounds = subtype_bounds(n_rows, fractions)
+
+    generator = LARD(seed=seed, max_tokens=max_tokens, overflow=overflow, time_budget=time_budget)
+    subtypes = {}
+    for subtype, (_, kwargs) in fractions.items():
+        first, stop = bounds[subtype]
+        subset = sample[(sample.index >= first) & (sample.index < stop)]
+        kwargs = dict(kwargs)
+        disfl_type = kwargs.pop('disfl_type')
+
+        created = subset
+        duration = 0.0
+        if len(subset) != 0:
+            # The warnings of LARD are not part of the plan
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                created = create_disfluencies(subset.copy(), column_text, disfl_type, generator=generator, **kwargs)
+                duration = time.perf_counter() - start
+
+        # The created frames are kept in memory with their tokens, and converted when they are written
+        written = to_span_schema(created) if output_schema == 'spans' else created
+        csv_data = written.to_csv(index=False).encode("utf-8") if len(written) else b""
+        rows = stop - first
+        scale = rows / len(subset) if len(subset) else 0.0
+        subtypes[subtype] = {'sampled_rows': len(subset),
+                             'sampled_kept_rows': len(created),
+                             'yield_ratio': len(created) / len(subset) if len(subset) else None,
+                             'rows': rows,
+                             'kept_rows': int(round(len(created) * scale)),
+                             'output_bytes': int(len(csv_data) * scale),
+                             'gzip_output_bytes': int(len(gzip.compress(csv_data)) * scale),
+                             'output_memory_bytes': int(created.memory_usage(deep=True).sum() * scale)
+                             if len(created) else 0,
+                             'seconds': duration * scale}
+
+    # Each row is written to its type file and to the final file
+    copies = int(create_all_files) + int(concat_files)
+    output_bytes = sum(counts['output_bytes'] for counts in subtypes.values())
+    gzip_output_bytes = sum(counts['gzip_output_bytes'] for counts in subtypes.values())
+    output_memory_bytes = sum(counts['output_memory_bytes'] for counts in subtypes.values())
+    seconds = sum(counts['seconds'] for counts in subtypes.values())
+
+    # The created frames are kept in memory until the end (twice when they are concatenated), unless the output is
+    # sharded, in which case only one chunk at a time is
+    if shard_size is None:
+        held_memory = output_memory_bytes * (2 if concat_files else 1)
+    else:
+        held_memory = output_memory_bytes * CHUNK_SIZE / n_rows if n_rows else 0
+    # The input is read in chunks: the chunk that is generated, the chunks that are read ahead and the last rows
+    # that the partners of the restarts are drawn from
+    input_bytes = row_bytes * min(n_rows, (QUEUE_SIZE + 2) * CHUNK_SIZE)
+    if encoded:
+        # The encoded corpus of the whole input is kept in memory
+        input_bytes += corpus_bytes(sample[column_text].tolist(), n_rows,
+                                    lambda text: generator.tokenize(text, count=False))
+    baseline_mb = current_rss_mb()
+
+    plan = {'input_rows': n_rows,
+            'sampled_rows': len(sample),
+            'kept_rows': sum(counts['kept_rows'] for counts in subtypes.values()),
+            'rows_per_sec': n_rows / seconds if seconds > 0 else None,
+            'seconds': seconds,
+            'output_bytes': output_bytes * copies,
+            'gzip_output_bytes': gzip_output_bytes * copies,
+            'peak_memory_mb': (baseline_mb + (input_bytes + held_memory) / 2 ** 20) if baseline_mb is not None
+            else None,
+            'subtypes': subtypes}
+
+    if print_plan:
+        print_dataset_plan(plan)
+
+    return plan
+
+
+def print_dataset_plan(plan):
+    print("Input rows: " + str(plan['input_rows']) + " (" + str(plan['sampled_rows']) + " sampled)")
+    for subtype, counts in plan['subtypes'].items():
+        if counts['sampled_rows'] == 0:
+            print(Fore.RED + "Warning! No rows of " + subtype + " were sampled. Increase the sample fraction to "
+                             "estimate its yield.")
+        yield_ratio = "N/A" if counts['yield_ratio'] is None else "{:.1f}%".format(100 * counts['yield_ratio'])
+        print("  " + subtype + ": " + str(counts['kept_rows']) + "/" + str(counts['rows']) + " rows (yield "
+              + yield_ratio + "), " + "{:.1f}".format(counts['output_bytes'] / 2 ** 20) + " MB, "
+              + format_duration(counts['seconds']))
+    print("Created rows: " + str(plan['kept_rows']))
+    print("Output size: " + "{:.1f}".format(plan['output_bytes'] / 2 ** 20) + " MB ("
+          + "{:.1f}".format(plan['gzip_output_bytes'] / 2 ** 20) + " MB with gzip)")
+    if plan['rows_per_sec'] is not None:
+        print("Throughput: " + "{:.1f}".format(plan['rows_per_sec']) + " rows/sec in one process, duration "
+              + format_duration(plan['seconds']))
+    if plan['peak_memory_mb'] is not None:
+        print("Peak memory: " + "{:.0f}".format(plan['peak_memory_mb']) + " MB")
+    print(Fore.GREEN + u'\u2713' + " Dry run completed, no output was written")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate the yield, size, duration and memory of create_dataset.")
+    parser.add_argument("input_file_path")
+    parser.add_argument("--column-text", default=None)
+    parser.add_argument("--keep-fluent", action="store_true")
+    parser.add_argument("--shard-size", type=int, default=None)
+    parser.add_argument("--encoded", action="store_true")
+    parser.add_argument("--sample-fraction", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--overflow", choices=['skip', 'truncate'], default='skip')
+    parser.add_argument("--time-budget", type=float, default=None)
+    parser.add_argument("--output-schema", choices=['tokens', 'spans'], default='tokens')
+    parser.add_argument("--json", action="store_true", help="Print the plan as json")
+    args = parser.parse_args()
+
+    result = plan_dataset(args.input_file_path, args.column_text, keep_fluent=args.keep_fluent,
+                          shard_size=args.shard_size, encoded=args.encoded, sample_fraction=args.sample_fraction,
+                          seed=args.seed,
+                          max_tokens=args.max_tokens, overflow=args.overflow, time_budget=args.time_budget,
+                          output_schema=args.output_schema, print_plan=not args.json)
+    if args.json:
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+
+from colorama import Fore
+
+METRICS_FORMATS = ['json', 'prometheus']
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "N/A"
+    seconds = int(seconds)
+    return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+class ProgressReporter:
+    """ Reports the progress of a create_dataset run: the processed rows, the rows/sec, the ETA and the yield
+    (rows that were actually created) of each disfluency subtype. The progress is refreshed periodically in a
+    background thread and can also be written to a metrics file.
+    """
+
+    def __init__(self, total_rows, interval=10.0, output_dir=None, metrics_format=None, print_progress=True):
+        """
+        Args:
+            total_rows (`int`): The number of rows of the run.
+
+            interval (`float`, *optional*, defaults to 10.0): The refresh interval in seconds.
+
+            output_dir (`str`, *optional*, defaults to 'None'): The directory of the metrics file.
+
+            metrics_format (`str`, *optional*, defaults to 'None'): The format of the metrics file, json
+            (progress.json) or prometheus (lard_progress.prom, for the textfile collector of the node exporter).
+            If it is not specified, no metrics file is written.
+
+            print_progress (`bool`, *optional*, defaults to True): Whether or not to print the progress.
+        """
+        if metrics_format is not None:
+            if metrics_format not in METRICS_FORMATS:
+                raise ValueError("Supported metrics formats: " + ", ".join(METRICS_FORMATS))
+            if output_dir is None:
+                raise ValueError("You have to specify the output directory of the metrics file.")
+
+        self.total_rows = total_rows
+        self.interval = interval
+        self.output_dir = output_dir
+        self.metrics_format = metrics_format
+        self.print_progress = print_progress
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.processed_rows = 0
+        self.kept_rows = 0
+        self.subtypes = {}
+        self.started = None
+
+    def update(self, subtype, processed_rows, kept_rows):
+        """ Add the processed and the created (kept) rows of a subtype. Can be used as the progress_callback
+        of create_dataset.
+        """
+        with self._lock:
+            self.processed_rows += processed_rows
+            self.kept_rows += kept_rows
+            counts = self.subtypes.setdefault(subtype, {'processed': 0, 'kept': 0})
+            counts['processed'] += processed_rows
+            counts['kept'] += kept_rows
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.time() - self.started if self.started is not None else 0.0
+            rows_per_sec = self.processed_rows / elapsed if elapsed > 0 else 0.0
+            remaining = max(0, self.total_rows - self.processed_rows)
+            return {'total_rows': self.total_rows,
+                    'processed_rows': self.processed_rows,
+                    'kept_rows': self.kept_rows,
+                    'elapsed': elapsed,
+                    'rows_per_sec': rows_per_sec,
+                    'eta': remaining / rows_per_sec if rows_per_sec > 0 else None,
+                    'subtypes': {subtype: dict(counts,
+                                               yield_ratio=counts['kept'] / counts['processed']
+                                               if counts['processed'] else None)
+                                 for subtype, counts in self.subtypes.items()}}
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.refresh()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.refresh()
+
+    def refresh(self):
+        snapshot = self.snapshot()
+
+        if self.print_progress:
+            percentage = 100 * snapshot['processed_rows'] / self.total_rows if self.total_rows else 100.0
+            print(Fore.CYAN + "Progress: " + str(snapshot['processed_rows']) + "/" + str(self.total_rows)
+                  + " rows (" + "{:.1f}".format(percentage) + "%), "
+                  + "{:.1f}".format(snapshot['rows_per_sec']) + " rows/sec, ETA "
+                  + format_duration(snapshot['eta']))
+
+        if self.metrics_format is not None:
+            self.write_metrics(snapshot)
+
+    def write_metrics(self, snapshot):
+        if self.metrics_format == 'json':
+            path = os.path.join(self.output_dir, "progress.json")
+            content = json.dumps(snapshot, indent=2)
+        else:
+            path = os.path.join(self.output_dir, "lard_progress.prom")
+            content = to_prometheus(snapshot)
+
+        # Write atomically, so that a scraper never reads a partial file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+def to_prometheus(snapshot):
+    """ Format a progress snapshot in the Prometheus text exposition format. """
+    lines = ["# HELP lard_rows_total Rows of the create_dataset run.",
+             "# TYPE lard_rows_total gauge",
+             "lard_rows_total " + str(snapshot['total_rows']),
+             "# HELP lard_rows_processed Rows processed so far.",
+             "# TYPE lard_rows_processed gauge",
+             "lard_rows_processed " + str(snapshot['processed_rows']),
+             "# HELP lard_rows_kept Rows with a created disfluency so far.",
+             "# TYPE lard_rows_kept gauge",
+             "lard_rows_kept " + str(snapshot['kept_rows']),
+             "# HELP lard_rows_per_second Processing throughput.",
+             "# TYPE lard_rows_per_second gauge",
+             "lard_rows_per_second " + str(snapshot['rows_per_sec']),
+             "# HELP lard_eta_seconds Estimated time to completion.",
+             "# TYPE lard_eta_seconds gauge",
+             "lard_eta_seconds " + (str(snapshot['eta']) if snapshot['eta'] is not None else "NaN"),
+             "# HELP lard_subtype_rows_processed Rows processed per disfluency subtype.",
+             "# TYPE lard_subtype_rows_processed gauge"]
+    lines.extend('lard_subtype_rows_processed{subtype="' + subtype + '"} ' + str(counts['processed'])
+                 for subtype, counts in snapshot['subtypes'].items())
+    lines.extend(["# HELP lard_subtype_rows_kept Rows with a created disfluency per disfluency subtype.",
+                  "# TYPE lard_subtype_rows_kept gauge"])
+    lines.extend('lard_subtype_rows_kept{subtype="' + subtype + '"} ' + str(counts['kept'])
+                 for subtype, counts in snapshot['subtypes'].items())
+    return "\n".join(lines) + "\n"
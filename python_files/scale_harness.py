@@ -0,0 +1,284 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+from colorama import Fore
+
+from python_files.create_dataset import create_dataset
+from python_files.worker_pool import process_memory
+
+NOUNS = ["coffee", "restaurant", "ticket", "flight", "hotel", "movie", "city", "friend", "family", "doctor",
+         "concert", "table", "room", "car", "train", "dinner", "house", "event", "song", "appointment"]
+VERBS = ["find", "book", "reserve", "watch", "visit", "buy", "play", "eat", "drink", "rent",
+         "leave", "arrive", "call", "need", "want", "like", "prefer", "search", "check", "cancel"]
+ADJECTIVES = ["cheap", "nice", "good", "big", "small", "late", "early", "quiet", "popular", "new",
+              "expensive", "great", "short", "long", "close", "famous", "fancy", "fast", "local", "open"]
+FUNCTION_WORDS = ["i", "you", "we", "the", "a", "to", "for", "in", "at", "with", "my", "this", "that", "and",
+                  "please", "can", "would", "is", "are", "some"]
+PUNCTUATION = [".", "?", "!", ","]
+
+
+class BudgetExceededError(Exception):
+    """ Raised when a scale test exceeds its memory or throughput budget. """
+
+
+def synthesize_sentence(length, rng):
+    """ Create a synthetic utterance with the given number of tokens. """
+    pools = [FUNCTION_WORDS, FUNCTION_WORDS, NOUNS, VERBS, ADJECTIVES]
+    tokens = [rng.choice(rng.choice(pools)) for _ in range(max(1, length - 1))]
+    # Occasional inner punctuation, as in the transcribed utterances
+    for _ in range(length // 15):
+        tokens.insert(rng.randrange(1, len(tokens) + 1), ",")
+    tokens.append(rng.choice(PUNCTUATION[:3]))
+    return " ".join(tokens)
+
+
+def sample_length(rng, length_distribution, mean_length, max_length):
+    if length_distribution == 'uniform':
+        length = rng.randint(1, 2 * mean_length - 1)
+    elif length_distribution == 'normal':
+        length = int(round(rng.gauss(mean_length, mean_length / 3)))
+    elif length_distribution == 'lognormal':
+        # Long-tailed lengths, with the same median length
+        length = int(round(rng.lognormvariate(0, 0.6) * mean_length))
+    else:
+        raise ValueError("Supported length distributions: uniform, normal or lognormal")
+    return max(1, min(max_length, length))
+
+
+def synthesize_corpus(output_path, n_rows, length_distribution='lognormal', mean_length=12, max_length=200,
+                      seed=0, column_text='text'):
+    """ Synthesize a .csv corpus for scale tests.
+
+    Args:
+        output_path (`str`): The path of the .csv file to create.
+
+        n_rows (`int`): The number of utterances.
+
+        length_distribution (`str`, *optional*, defaults to 'lognormal'): The distribution of the utterance lengths
+        (in tokens). Supported values uniform, normal or lognormal.
+
+        mean_length (`int`, *optional*, defaults to 12): The mean (median for lognormal) utterance length.
+
+        max_length (`int`, *optional*, defaults to 200): The maximum utterance length.
+
+        seed (`int`, *optional*, defaults to 0): The seed of the corpus.
+
+        column_text (`str`, *optional*, defaults to 'text'): The name of the text column.
+
+    Returns:
+        n_bytes (`int`): The size of the created file
+    """
+    rng = random.Random(seed)
+    with open(output_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([column_text])
+        for _ in range(n_rows):
+            writer.writerow([synthesize_sentence(sample_length(rng, length_distribution, mean_length, max_length),
+                                                 rng)])
+    return os.path.getsize(output_path)
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """ The peak RSS of the process (RUSAGE_SELF) or of its largest terminated and waited-for child process
+    (RUSAGE_CHILDREN), e.g. a worker of the pool after pool.close().
+    """
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def workers_memory_mb():
+    """ The memory of the process and of its worker processes together, in MB. The proportional set size is
+    summed, so the pages that the forked workers share with the process are counted once (Linux only).
+
+    Returns:
+        memory (`float`), workers_memory (`float`): The memory of the process and its workers, and of the workers
+        alone. None if they are not available.
+    """
+    parent = process_memory(os.getpid())
+    if not parent:
+        return None, None
+    workers = [process_memory(child.pid) for child in multiprocessing.active_children()]
+    workers_pss_kb = sum(worker.get('pss_kb', 0) for worker in workers)
+    return (parent['pss_kb'] + workers_pss_kb) / 2 ** 10, workers_pss_kb / 2 ** 10
+
+
+def run_scale_test(n_rows,
+                   output_dir,
+                   length_distribution='lognormal',
+                   mean_length=12,
+                   max_length=200,
+                   seed=0,
+                   max_rss_mb=None,
+                   max_traced_mb=None,
+                   min_rows_per_sec=None,
+                   trace_memory=True,
+                   sample_interval=1.0,
+                   **dataset_kwargs):
+    """ Run create_dataset end to end on a synthetic corpus and check it against memory and throughput budgets.
+
+    Args:
+        n_rows (`int`): The number of rows of the synthetic corpus.
+
+        output_dir (`str`): The directory to store the corpus, the created files and the report (scale_report.json).
+
+        length_distribution, mean_length, max_length, seed: The parameters of synthesize_corpus.
+
+        max_rss_mb (`float`, *optional*, defaults to 'None'): The peak resident memory budget in MB. With workers,
+        it is checked against the memory of the process and its workers together (sampled every sample_interval)
+        and against the peak RSS of the largest worker, as well as the peak RSS of the process.
+
+        max_traced_mb (`float`, *optional*, defaults to 'None'): The peak Python allocations budget in MB,
+        as measured by tracemalloc.
+
+        min_rows_per_sec (`float`, *optional*, defaults to 'None'): The minimum overall throughput.
+
+        trace_memory (`bool`, *optional*, defaults to True): Whether or not to trace the Python allocations with
+        tracemalloc. Tracing slows down the generation.
+
+        sample_interval (`float`, *optional*, defaults to 1.0): The interval in seconds of the RSS and throughput
+        timeline.
+
+        dataset_kwargs: Any other parameter of create_dataset.
+
+    Returns:
+        report (`dict`): The measurements of the run.
+
+    Raises:
+        BudgetExceededError: If a budget is exceeded. The report is saved before raising.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    input_path = os.path.join(output_dir, "scale_input.csv")
+    data_dir = os.path.join(output_dir, "output")
+    os.makedirs(data_dir, exist_ok=True)
+
+    print("Synthesizing " + str(n_rows) + " rows...")
+    input_bytes = synthesize_corpus(input_path, n_rows, length_distribution, mean_length, max_length, seed)
+
+    processed = {'rows': 0, 'kept': 0}
+    subtypes = {}
+    timeline = []
+    peaks = {'total_mb': 0.0, 'workers_mb': 0.0}
+    done = threading.Event()
+
+    def progress_callback(subtype, processed_rows, kept_rows):
+        processed['rows'] += processed_rows
+        processed['kept'] += kept_rows
+        counts = subtypes.setdefault(subtype, {'rows': 0, 'kept': 0})
+        counts['rows'] += processed_rows
+        counts['kept'] += kept_rows
+
+    started = time.perf_counter()
+
+    def sample():
+        while not done.wait(sample_interval):
+            elapsed = time.perf_counter() - started
+            total_mb, workers_mb = workers_memory_mb()
+            if total_mb is not None:
+                peaks['total_mb'] = max(peaks['total_mb'], total_mb)
+                peaks['workers_mb'] = max(peaks['workers_mb'], workers_mb)
+            timeline.append({'elapsed': elapsed,
+                             'rss_mb': current_rss_mb(),
+                             'workers_mb': workers_mb,
+                             'rows': processed['rows'],
+                             'rows_per_sec': processed['rows'] / elapsed})
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    if trace_memory:
+        tracemalloc.start()
+    sampler.start()
+
+    try:
+        create_dataset(input_path, 'text', output_dir=data_dir, progress_callback=progress_callback,
+                       **dataset_kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        done.set()
+        sampler.join()
+        traced_peak_mb = None
+        if trace_memory:
+            traced_peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+
+    report = {'rows': n_rows,
+              'length_distribution': length_distribution,
+              'mean_length': mean_length,
+              'input_bytes': input_bytes,
+              'elapsed': elapsed,
+              'rows_per_sec': n_rows / elapsed if elapsed > 0 else None,
+              'kept_rows': processed['kept'],
+              'subtypes': subtypes,
+              'peak_rss_mb': peak_rss_mb(),
+              'peak_worker_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+              'peak_workers_mb': peaks['workers_mb'],
+              'traced_peak_mb': traced_peak_mb,
+              'output_bytes': sum(os.path.getsize(os.path.join(data_dir, name)) for name in os.listdir(data_dir)),
+              'timeline': timeline}
+
+    # The memory of the whole job: the process, the process with its workers and the largest worker on its own
+    report['peak_total_mb'] = max(report['peak_rss_mb'], peaks['total_mb'], report['peak_worker_rss_mb'])
+
+    violations = []
+    if max_rss_mb is not None and report['peak_total_mb'] > max_rss_mb:
+        violations.append("Peak RSS " + "{:.1f}".format(report['peak_total_mb']) + " MB exceeds the budget of "
+                          + str(max_rss_mb) + " MB")
+    if max_traced_mb is not None and traced_peak_mb is not None and traced_peak_mb > max_traced_mb:
+        violations.append("Peak traced memory " + "{:.1f}".format(traced_peak_mb) + " MB exceeds the budget of "
+                          + str(max_traced_mb) + " MB")
+    if min_rows_per_sec is not None and report['rows_per_sec'] < min_rows_per_sec:
+        violations.append("Throughput " + "{:.1f}".format(report['rows_per_sec']) + " rows/sec is below the budget of "
+                          + str(min_rows_per_sec) + " rows/sec")
+    report['violations'] = violations
+
+    with open(os.path.join(output_dir, "scale_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    if violations:
+        for violation in violations:
+            print(Fore.RED + violation)
+        raise BudgetExceededError("; ".join(violations))
+
+    print(Fore.GREEN + u'\u2713' + " Scale test of " + str(n_rows) + " rows completed in "
+          + "{:.1f}".format(elapsed) + " s (" + "{:.1f}".format(report['rows_per_sec']) + " rows/sec, peak RSS "
+          + "{:.1f}".format(report['peak_total_mb']) + " MB)")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scale test of create_dataset on a synthetic corpus.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--output-dir", default="scale_test")
+    parser.add_argument("--length-distribution", default="lognormal", choices=["uniform", "normal", "lognormal"])
+    parser.add_argument("--mean-length", type=int, default=12)
+    parser.add_argument("--max-length", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    parser.add_argument("--max-traced-mb", type=float, default=None)
+    parser.add_argument("--min-rows-per-sec", type=float, default=None)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Do not trace the Python allocations")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        run_scale_test(args.rows, args.output_dir, args.length_distribution, args.mean_length, args.max_length,
+                       args.seed, args.max_rss_mb, args.max_traced_mb, args.min_rows_per_sec,
+                       trace_memory=not args.no_tracemalloc, workers=args.workers)
+    except BudgetExceededError:
+        sys.exit(1)
@@ -0,0 +1,349 @@
+import argparse
+import json
+import math
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from colorama import Fore
+
+from python_files.disfluency_generation import LARD
+
+DISFLUENCY_TYPES = ['repetition', 'replacement', 'restart']
+
+RESULT_FIELDS = {'repetition': ['disfluent_sentence', 'fluent_tokens', 'disfluent_tokens', 'annotations', 'degree'],
+                 'replacement': ['disfluent_sentence', 'fluent_tokens', 'disfluent_tokens', 'annotations',
+                                 'disfl_type'],
+                 'restart': ['disfluent_sentence', 'fluent_tokens', 'disfluent_tokens', 'annotations', 'disfl_type']}
+
+
+def percentile(values, q):
+    """ Nearest-rank percentile of a list of values (q in [0, 100]). """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+class ServerMetrics:
+    """ Latency and throughput counters of the server. """
+
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._batch_sizes = deque(maxlen=window)
+        self.started = time.time()
+        self.requests = 0
+        self.sentences = 0
+        self.batches = 0
+        self.errors = 0
+
+    def record_request(self, n_sentences, latency):
+        with self._lock:
+            self.requests += 1
+            self.sentences += n_sentences
+            self._latencies.append(latency)
+
+    def record_batch(self, n_sentences):
+        with self._lock:
+            self.batches += 1
+            self._batch_sizes.append(n_sentences)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            batch_sizes = list(self._batch_sizes)
+            uptime = time.time() - self.started
+            return {'uptime': uptime,
+                    'requests': self.requests,
+                    'sentences': self.sentences,
+                    'batches': self.batches,
+                    'errors': self.errors,
+                    'latency_p50': percentile(latencies, 50),
+                    'latency_p99': percentile(latencies, 99),
+                    'requests_per_sec': self.requests / uptime if uptime > 0 else 0.0,
+                    'sentences_per_sec': self.sentences / uptime if uptime > 0 else 0.0,
+                    'mean_batch_size': sum(batch_sizes) / len(batch_sizes) if batch_sizes else None}
+
+
+class MicroBatcher(threading.Thread):
+    """ Coalesces the concurrent requests that arrive within the batch window into micro-batches.
+    The requests with the same disfluency type and parameters are generated together, so that the sequences are
+    tagged in one call and the replacements of each word are looked up once per batch.
+    """
+
+    def __init__(self, lard, metrics, batch_window=0.005, max_batch_size=64):
+        super().__init__(daemon=True)
+        self.lard = lard
+        self.metrics = metrics
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._jobs = queue.Queue()
+        self._stopped = threading.Event()
+
+    def submit(self, disfl_type, params, items):
+        """ Queue a request and return a Future with its results. """
+        future = Future()
+        self._jobs.put((disfl_type, params, items, future))
+        return future
+
+    def stop(self):
+        self._stopped.set()
+        self._jobs.put(None)
+
+    def run(self):
+        while not self._stopped.is_set():
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            jobs = [job]
+            n_items = len(job[2])
+            deadline = time.monotonic() + self.batch_window
+            while n_items < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    job = self._jobs.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._stopped.set()
+                    break
+                jobs.append(job)
+                n_items += len(job[2])
+
+            self.process(jobs)
+
+    def process(self, jobs):
+        groups = {}
+        for job in jobs:
+            groups.setdefault((job[0], job[1]), []).append(job)
+
+        for (disfl_type, params), group in groups.items():
+            items = [item for job in group for item in job[2]]
+            try:
+                results = self.generate(disfl_type, params, items)
+            except Exception as e:
+                for job in group:
+                    job[3].set_exception(e)
+                continue
+
+            self.metrics.record_batch(len(items))
+            start = 0
+            for job in group:
+                job[3].set_result(results[start:start + len(job[2])])
+                start += len(job[2])
+
+    def generate(self, disfl_type, params, items):
+        params = dict(params)
+        if disfl_type == 'repetition':
+            return [self.lard.create_repetitions(item, params['degree']) for item in items]
+        if disfl_type == 'replacement':
+            return self.lard.create_replacements_batch(items, params['pos'], params['with_cue'])
+        return [self.lard.create_restarts(item[0], item[1]) for item in items]
+
+
+def parse_request(payload):
+    """ Validate a generation request.
+
+    Returns:
+        disfl_type (`str`), params (`tuple`), items (List): The disfluency type, its parameters and the
+        sentences (or the sentence pairs of the restarts)
+    """
+    disfl_type = payload.get('type', 'repetition')
+    if disfl_type not in DISFLUENCY_TYPES:
+        raise ValueError("Unsupported disfluency type. Supported types: " + ", ".join(DISFLUENCY_TYPES))
+
+    if 'sentences' in payload:
+        items = payload['sentences']
+    elif 'sentence' in payload:
+        items = [payload['sentence']]
+    else:
+        raise ValueError("You have to specify a 'sentence' or a list of 'sentences'.")
+
+    if not isinstance(items, list) or not items:
+        raise ValueError("The 'sentences' must be a non-empty list.")
+
+    if disfl_type == 'restart':
+        if not all(isinstance(item, list) and len(item) == 2 and all(isinstance(s, str) and s for s in item)
+                   for item in items):
+            raise ValueError("A restart needs a pair of non-empty fluent sentences.")
+        items = [tuple(item) for item in items]
+        params = ()
+    else:
+        if not all(isinstance(item, str) and item for item in items):
+            raise ValueError("The sentences must be non-empty strings.")
+        if disfl_type == 'repetition':
+            degree = payload.get('degree')
+            # JSON true and 1.0 are equal to 1 in Python, so the type is checked too
+            if type(degree) is not int or degree not in (1, 2, 3):
+                raise ValueError("The degree of a repetition must be 1, 2 or 3.")
+            params = (('degree', degree),)
+        else:
+            pos = payload.get('pos')
+            if pos not in (None, 'NOUN', 'VERB', 'ADJ'):
+                raise ValueError("You need to specify a valid POS identifier. Supported POS: NOUN, VERB or ADJ")
+            with_cue = payload.get('with_cue', True)
+            if not isinstance(with_cue, bool):
+                raise ValueError("The 'with_cue' must be true or false.")
+            params = (('pos', pos), ('with_cue', with_cue))
+
+    return disfl_type, params, items
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            # The sequences that were skipped or truncated by the guards of LARD
+            self.send_json(200, dict(self.server.metrics.snapshot(), guards=self.server.batcher.lard.guard_stats()))
+        else:
+            self.send_json(404, {'error': "Not found"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self.send_json(404, {'error': "Not found"})
+            return
+
+        received = time.perf_counter()
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            disfl_type, params, items = parse_request(payload)
+        except (ValueError, AttributeError) as e:
+            self.server.metrics.record_error()
+            self.send_json(400, {'error': str(e)})
+            return
+
+        try:
+            results = self.server.batcher.submit(disfl_type, params, items).result(self.server.request_timeout)
+        except Exception as e:
+            self.server.metrics.record_error()
+            self.send_json(500, {'error': str(e)})
+            return
+
+        fields = RESULT_FIELDS[disfl_type]
+        self.server.metrics.record_request(len(items), time.perf_counter() - received)
+        self.send_json(200, {'results': [None if result[0] is None else dict(zip(fields, result))
+                                         for result in results]})
+
+
+class LARDServer:
+    """ Local HTTP server around LARD.
+
+    POST /generate with a JSON body: {"type": "repetition" | "replacement" | "restart",
+    "sentence": ... or "sentences": [...], "degree": 1-3, "pos": "NOUN" | "VERB" | "ADJ", "with_cue": true}.
+    Restarts take pairs of sentences. GET /metrics returns the latency percentiles and the throughput counters.
+    """
+
+    def __init__(self, lard=None, host="127.0.0.1", port=0, batch_window=0.005, max_batch_size=64,
+                 request_timeout=60):
+        """
+        Args:
+            lard (`LARD`, *optional*, defaults to 'None'): The LARD instance. If not specified, a new one is created.
+
+            host (`str`, *optional*, defaults to '127.0.0.1'): The host to bind to.
+
+            port (`int`, *optional*, defaults to 0): The port to bind to. If it is 0, a free port is selected.
+
+            batch_window (`float`, *optional*, defaults to 0.005): The time in seconds to wait for more requests
+            before generating a micro-batch.
+
+            max_batch_size (`int`, *optional*, defaults to 64): The maximum number of sentences in a micro-batch.
+
+            request_timeout (`float`, *optional*, defaults to 60): The time in seconds to wait for the results
+            of a request.
+        """
+        self.metrics = ServerMetrics()
+        self.batcher = MicroBatcher(lard if lard is not None else LARD(), self.metrics, batch_window, max_batch_size)
+
+        self._httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.metrics = self.metrics
+        self._httpd.batcher = self.batcher
+        self._httpd.request_timeout = request_timeout
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return "http://" + host + ":" + str(port)
+
+    def start(self):
+        self.batcher.start()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self):
+        self._thread.join()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self.batcher.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def generate(url, payload, timeout=60):
+    """ Send a generation request to a running LARD server and return the list of results. """
+    request = urllib.request.Request(url + "/generate", data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())['results']
+
+
+def metrics(url, timeout=60):
+    """ Fetch the metrics of a running LARD server. """
+    with urllib.request.urlopen(url + "/metrics", timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve LARD disfluency generation on localhost.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-window", type=float, default=0.005,
+                        help="Seconds to wait for more requests before generating a micro-batch")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--lexicon", default=None, help="Path of a compiled replacement lexicon")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Maximum number of tokens of a sentence")
+    parser.add_argument("--overflow", default='skip', choices=['skip', 'truncate'],
+                        help="Whether to skip or truncate the sentences with more than max-tokens tokens")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="Maximum processing time of a sentence in seconds")
+    args = parser.parse_args()
+
+    lard = LARD(lexicon=args.lexicon, max_tokens=args.max_tokens, overflow=args.overflow, time_budget=args.time_budget)
+    server = LARDServer(lard, args.host, args.port, args.batch_window, args.max_batch_size)
+    server.start()
+    print(Fore.GREEN + "LARD server listening on " + server.url)
+    try:
+        server.join()
+    except KeyboardInterrupt:
+        server.stop()
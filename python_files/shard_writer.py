@@ -0,0 +1,120 @@
+import gzip
+import os
+import queue
+import threading
+
+COMPRESSIONS = {'gzip': ".csv.gz", None: ".csv"}
+
+
+class _Shard:
+
+    def __init__(self, path, compression):
+        self.path = path
+        self._raw = open(path, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb") if compression == 'gzip' else self._raw
+
+    def write(self, data):
+        self._file.write(data)
+
+    def size(self):
+        # The (compressed) bytes written to the disk so far
+        return self._raw.tell()
+
+    def close(self):
+        if self._file is not self._raw:
+            self._file.close()
+        self._raw.close()
+
+
+class ShardWriter:
+    """ Background writer of the created disfluencies.
+    The frames are passed through a bounded queue to a writer thread, that serializes them to compressed .csv
+    shards while the generation continues. Each output stream (e.g. repeat or final_disfluent_set) is rotated
+    to a new shard when its size exceeds max_shard_bytes. Every shard has its own header.
+    """
+
+    def __init__(self, output_dir, max_shard_bytes=256 * 2 ** 20, compression='gzip', queue_size=8):
+        """
+        Args:
+            output_dir (`str`): The directory to store the shards.
+
+            max_shard_bytes (`int`, *optional*, defaults to 256MB): The size (on disk) after which a shard is rotated.
+
+            compression (`str`, *optional*, defaults to 'gzip'): The compression of the shards, gzip or None.
+
+            queue_size (`int`, *optional*, defaults to 8): The maximum number of frames waiting to be written.
+            When the queue is full, the generation waits for the writer.
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError("Supported compressions: gzip or None")
+
+        self.output_dir = output_dir
+        self.max_shard_bytes = max_shard_bytes
+        self.compression = compression
+        self.shards = {}
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._current = {}
+        self._columns = {}
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def write(self, stream, frame):
+        """ Queue a frame to be written to an output stream. """
+        if self._error is not None:
+            raise self._error
+        if len(frame) != 0:
+            self._queue.put((stream, frame))
+
+    def close(self):
+        """ Wait until all the queued frames are written and close the shards.
+
+        Returns:
+            shards (`dict`): The paths of the shards of each stream
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.shards
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._write(*item)
+            except Exception as e:
+                self._error = e
+
+        for shard in self._current.values():
+            shard.close()
+
+    def _write(self, stream, frame):
+        # All the frames of a stream are written with the columns of its first frame
+        if stream not in self._columns:
+            self._columns[stream] = list(frame.columns)
+        else:
+            frame = frame.reindex(columns=self._columns[stream])
+
+        shard = self._current.get(stream)
+        if shard is not None and shard.size() >= self.max_shard_bytes:
+            shard.close()
+            shard = None
+
+        header = shard is None
+        if shard is None:
+            paths = self.shards.setdefault(stream, [])
+            path = os.path.join(self.output_dir,
+                                stream + "-" + "{:05d}".format(len(paths)) + COMPRESSIONS[self.compression])
+            shard = self._current[stream] = _Shard(path, self.compression)
+            paths.append(path)
+
+        shard.write(frame.to_csv(index=False, header=header).encode("utf-8"))
@@ -0,0 +1,143 @@
+import nltk
+import pandas as pd
+
+from python_files.utils import REPAIR_CUES, align_token_offsets
+
+COMPONENTS = ['reparandum', 'interregnum', 'repair']
+
+# The columns of the legacy schema that the span schema replaces
+TOKEN_COLUMNS = ['fluent_tokens', 'disfluent_tokens', 'annotations']
+
+SPAN_COLUMNS = [component + suffix for component in COMPONENTS
+                for suffix in ('_start', '_end', '_char_start', '_char_end')]
+
+# The repair cues as tokens, the longest first
+CUE_TOKENS = sorted((cue.split() for cue, _ in REPAIR_CUES), key=len, reverse=True)
+
+
+def is_replacement(disfl_type):
+    return disfl_type not in ('fluency', 'repetition', 'restart')
+
+
+def disfluent_tokens_of(disfl_type, disfluent_sentence):
+    """ The disfluent tokens of a sentence, as LARD creates them: the sentences of the replacements (and the fluencies)
+    are tokenized again, while the tokens of the repetitions and the restarts are joined with spaces.
+    """
+    if is_replacement(disfl_type) or disfl_type == 'fluency':
+        return nltk.word_tokenize(disfluent_sentence)
+    return disfluent_sentence.split(" ")
+
+
+def token_spans(disfl_type, disfluent_tokens, annotations):
+    """ Find the [start, end) token offsets of the reparandum, the interregnum and the repair of a disfluency
+    from its token-level annotations.
+
+    Returns:
+        spans (`dict`): The (start, end) of each component. The spans of a fluency are empty.
+    """
+    disfluent = [idx for idx, annotation in enumerate(annotations) if annotation == 'D']
+    if not disfluent:
+        return {component: (0, 0) for component in COMPONENTS}
+
+    start, end = disfluent[0], disfluent[-1] + 1
+    interregnum_start = end
+
+    if disfl_type == 'restart':
+        # The repair is the fluent sentence that restarts
+        return {'reparandum': (start, end), 'interregnum': (end, end), 'repair': (end, len(disfluent_tokens))}
+
+    if not is_replacement(disfl_type):
+        # A repetition is repaired by the repeated tokens
+        return {'reparandum': (start, end), 'interregnum': (end, end), 'repair': (end, min(2 * end - start,
+                                                                                             len(disfluent_tokens)))}
+
+    if disfl_type.endswith("_with_cue"):
+        for cue in CUE_TOKENS:
+            if end - len(cue) > start and disfluent_tokens[end - len(cue):end] == cue:
+                interregnum_start = end - len(cue)
+                break
+
+    # The repair repeats the context before the replaced word and then the word itself
+    reparandum = disfluent_tokens[start:interregnum_start]
+    context = 0
+    while context < len(reparandum) - 1 and end + context < len(disfluent_tokens) and \
+            disfluent_tokens[end + context] == reparandum[context]:
+        context += 1
+
+    return {'reparandum': (start, interregnum_start), 'interregnum': (interregnum_start, end),
+            'repair': (end, min(end + context + 1, len(disfluent_tokens)))}
+
+
+def span_columns(disfl_type, disfluent_sentence, disfluent_tokens, annotations):
+    """ The token and character offsets of the components of a disfluency, as the columns of the span schema. """
+    spans = token_spans(disfl_type, disfluent_tokens, annotations)
+    offsets = align_token_offsets(disfluent_sentence, disfluent_tokens)
+
+    def char_offset(token_idx, at_end=False):
+        if token_idx >= len(offsets) or offsets[token_idx] is None:
+            return len(disfluent_sentence) if token_idx >= len(offsets) else -1
+        return offsets[token_idx][1 if at_end else 0]
+
+    columns = {}
+    for component, (start, end) in spans.items():
+        columns[component + '_start'] = start
+        columns[component + '_end'] = end
+        columns[component + '_char_start'] = char_offset(start)
+        columns[component + '_char_end'] = char_offset(end - 1, at_end=True) if end > start else char_offset(start)
+    return columns
+
+
+def to_span_schema(frame):
+    """ Convert created disfluencies to the span schema: the disfluent sentence is stored once, with the token and
+    character offsets of its reparandum, interregnum and repair, instead of the fluent tokens, the disfluent tokens
+    and the annotations.
+    """
+    if len(frame) == 0:
+        return frame.drop(columns=TOKEN_COLUMNS, errors='ignore').reindex(
+            columns=[column for column in frame.columns if column not in TOKEN_COLUMNS] + SPAN_COLUMNS)
+
+    rows = []
+    for disfl_type, disfluent_sentence, annotations in zip(frame['disfl_type'], frame['disfluent_sentence'],
+                                                           frame['annotations']):
+        rows.append(span_columns(disfl_type, disfluent_sentence, disfluent_tokens_of(disfl_type, disfluent_sentence),
+                                 annotations))
+
+    spans = pd.DataFrame(rows, index=frame.index, columns=SPAN_COLUMNS)
+    return pd.concat([frame.drop(columns=TOKEN_COLUMNS, errors='ignore'), spans], axis=1)
+
+
+def to_legacy_schema(frame):
+    """ Rebuild the fluent tokens, the disfluent tokens and the annotations of disfluencies in the span schema.
+    The reparandum and the interregnum are annotated as disfluent (D) and the rest tokens as fluent (F).
+    """
+    frame = frame.copy()
+    disfluent_tokens = [disfluent_tokens_of(disfl_type, disfluent_sentence)
+                        for disfl_type, disfluent_sentence in zip(frame['disfl_type'], frame['disfluent_sentence'])]
+
+    annotations = []
+    for tokens, start, end in zip(disfluent_tokens, frame['reparandum_start'], frame['interregnum_end']):
+        annotations.append(["D" if start <= idx < end else "F" for idx in range(len(tokens))])
+
+    frame['fluent_tokens'] = [[token for token, annotation in zip(tokens, row_annotations) if annotation == "F"]
+                              for tokens, row_annotations in zip(disfluent_tokens, annotations)]
+    frame['disfluent_tokens'] = disfluent_tokens
+    frame['annotations'] = annotations
+    return frame.drop(columns=SPAN_COLUMNS)
+
+
+def load_dataset(paths, legacy=False):
+    """ Load created disfluencies in the span schema (a .csv file, a .csv.gz shard or a list of them).
+
+    Args:
+        paths (`str` or List[`str`]): The files to load.
+
+        legacy (`bool`, *optional*, defaults to False): Whether or not to rebuild the fluent tokens, the disfluent
+        tokens and the annotations of the legacy schema.
+
+    Returns:
+        frame (`pd.DataFrame`): The loaded disfluencies
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    frame = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+    return to_legacy_schema(frame) if legacy else frame
@@ -1,3 +1,5 @@
+import functools
+
 import nltk
 from nltk.corpus import wordnet
 
@@ -56,3 +58,38 @@ def revert_pos_format(pos):
         candidate_pos = ''
 
     return candidate_pos
+
+
+# The forms of the quotes after word_tokenize
+QUOTE_FORMS = {'``': ['"', "``"], "''": ['"', "''"]}
+
+
+@functools.lru_cache(maxsize=None)
+def load_sentence_tokenizer(language='english'):
+    if hasattr(nltk.tokenize, 'PunktTokenizer'):
+        # nltk>=3.9 loads the punkt_tab models
+        return nltk.tokenize.PunktTokenizer(language)
+    return nltk.data.load('tokenizers/punkt/' + language + '.pickle')
+
+
+def sentence_spans(document, language='english'):
+    """ The (start, end) character offsets of the sentences of a document, found with the punkt tokenizer. """
+    return list(load_sentence_tokenizer(language).span_tokenize(document))
+
+
+def align_token_offsets(text, tokens):
+    """ Find the (start, end) character offsets of the tokens of word_tokenize in the text.
+    The offset of a token that cannot be found in the text is None.
+    """
+    offsets = []
+    position = 0
+    for token in tokens:
+        found = None
+        for form in QUOTE_FORMS.get(token, [token]):
+            start = text.find(form, position)
+            if start != -1 and (found is None or start < found[0]):
+                found = (start, start + len(form))
+        offsets.append(found)
+        if found is not None:
+            position = found[1]
+    return offsets
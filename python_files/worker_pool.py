@@ -0,0 +1,215 @@
+import bisect
+import gc
+import multiprocessing
+import os
+import random
+import time
+
+import nltk
+from colorama import Fore
+
+from python_files.disfluency_generation import LARD
+from python_files.line_index import read_range
+from python_files.utils import extract_syns_ants
+
+# The LARD instance of the parent process, inherited by the forked workers
+_worker_lard = None
+
+
+def warm_up(lard):
+    """ Load and warm the punkt tokenizer, the perceptron tagger and WordNet (or the replacement lexicon),
+    so that they are loaded only once in the parent process.
+    """
+    tokens = nltk.word_tokenize("I would like to find a place to eat.")
+    nltk.pos_tag(tokens)
+    if lard.lexicon is None:
+        extract_syns_ants("eat", "VERB")
+    else:
+        lard.lexicon.replacements("eat", "VERB")
+
+
+def process_memory(pid):
+    """ Read the memory of a process from /proc (Linux only).
+
+    Returns:
+        memory (`dict`): The resident set size, the proportional set size and the private (not shared
+        with the parent) memory of the process in kB. If they are not available, an empty dict is returned.
+    """
+    memory = {}
+    try:
+        with open("/proc/" + str(pid) + "/smaps_rollup") as f:
+            for line in f:
+                fields = line.split()
+                if fields[0] in ("Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"):
+                    memory[fields[0][:-1].lower()] = int(fields[1])
+    except (OSError, IndexError, ValueError):
+        return {}
+
+    return {'rss_kb': memory.get('rss', 0),
+            'pss_kb': memory.get('pss', 0),
+            'private_kb': memory.get('private_clean', 0) + memory.get('private_dirty', 0)}
+
+
+def _init_worker(forked_at, started):
+    # The guard counts of the parent are not counted again by the workers
+    _worker_lard.guard_counts.clear()
+    started.put((os.getpid(), time.time() - forked_at))
+
+
+def _take_guard_counts():
+    # The guards counted by the worker since its last task, that are sent back to the parent
+    counts = dict(_worker_lard.guard_counts)
+    _worker_lard.guard_counts.clear()
+    return counts
+
+
+def _call(task):
+    method, args, seed = task
+    result = getattr(_worker_lard, method)(*args, rng=random.Random(seed))
+    return result, _take_guard_counts()
+
+
+def _call_lines(task):
+    # The worker reads the lines of its part of the corpus and puts each sentence in the arguments of its call
+    method, path, first, byte_start, byte_end, slot, calls = task
+    lines = read_range(path, byte_start, byte_end)
+    results = []
+    for row, args, seed in calls:
+        args = list(args)
+        args[slot] = lines[row - first]
+        results.append(getattr(_worker_lard, method)(*args, rng=random.Random(seed)))
+    return results, _take_guard_counts()
+
+
+class LARDPool:
+    """ Pool of pre-warmed worker processes.
+    The NLTK models are loaded once in the parent process and the workers are forked afterwards,
+    so they share the loaded models copy-on-write instead of loading their own copies.
+    Every call draws from its own random generator, derived from the random generator of LARD and the position of
+    the call, as in LARD.generate_batch. The results are therefore the same with any number of workers and any
+    scheduling of the tasks.
+    """
+
+    def __init__(self, processes=None, lard=None):
+        """
+        Args:
+            processes (`int`, *optional*, defaults to 'None'): The number of worker processes. If it is not
+            specified, the number of CPUs is used.
+
+            lard (`LARD`, *optional*, defaults to 'None'): The LARD instance to share with the workers.
+            If it is not specified, a new LARD instance is created.
+        """
+        global _worker_lard
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise ValueError("The worker pool requires the 'fork' start method, which is not available on this "
+                             "platform.")
+
+        self.lard = lard if lard is not None else LARD()
+        self.processes = processes if processes is not None else os.cpu_count()
+
+        warm_up(self.lard)
+        _worker_lard = self.lard
+
+        # Move the loaded objects out of the garbage collector generations, so that the collections
+        # of the workers do not write to (and copy) the shared pages
+        gc.collect()
+        gc.freeze()
+
+        context = multiprocessing.get_context("fork")
+        self._started = context.SimpleQueue()
+        self._start_latencies = {}
+        self._pool = context.Pool(self.processes, initializer=_init_worker,
+                                  initargs=(time.time(), self._started))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        gc.unfreeze()
+
+    def map(self, method, args_list, chunksize=None):
+        """ Call a LARD method in the workers, once for every tuple of arguments, preserving the input order. """
+        # The forked workers inherit the same state of the random generator, so each task gets its own seed
+        batch_seed = str(self.lard.rng.getrandbits(64)) + ":"
+        results = self._pool.map(_call, [(method, tuple(args), batch_seed + str(idx))
+                                         for idx, args in enumerate(args_list)], chunksize)
+        return self._merge(results)
+
+    def map_lines(self, method, args_list, line_index, rows, slot=0):
+        """ Call a LARD method in the workers, as map, for sentences that are lines of a .txt corpus. The sentences
+        are not sent to the workers: the lines are split into a part per worker with LineIndex.partition and each
+        worker reads the byte range of its part from the corpus.
+
+        Args:
+            method (`str`): The LARD method.
+
+            args_list (List[`tuple`]): The arguments of each call. The sentence at position slot is not sent.
+
+            line_index (`LineIndex`): The line index of the corpus.
+
+            rows (List[`int`]): The line of the sentence of each call, in ascending order.
+
+            slot (`int`, *optional*, defaults to 0): The position of the sentence in the arguments.
+
+        Returns:
+            results (List[`tuple`]): The results of the calls, the same with map
+        """
+        if len(args_list) == 0:
+            return []
+
+        batch_seed = str(self.lard.rng.getrandbits(64)) + ":"
+        rows = list(rows)
+        tasks = []
+        for first, stop, byte_start, byte_end in line_index.partition(self.processes, rows[0], rows[-1] + 1):
+            calls = []
+            for idx in range(bisect.bisect_left(rows, first), bisect.bisect_left(rows, stop)):
+                args = list(args_list[idx])
+                args[slot] = None
+                calls.append((rows[idx], tuple(args), batch_seed + str(idx)))
+            if calls:
+                tasks.append((method, line_index.path, first, byte_start, byte_end, slot, calls))
+
+        return [result for part in self._merge(self._pool.map(_call_lines, tasks, 1)) for result in part]
+
+    def _merge(self, results):
+        # The guards counted in the workers are added to the counts of the parent LARD
+        for _, counts in results:
+            if counts:
+                self.lard.merge_guard_counts(counts)
+        return [result for result, _ in results]
+
+    def create_repetitions(self, fluent_sentences, degree=None):
+        return self.map('create_repetitions', [(sentence, degree) for sentence in fluent_sentences])
+
+    def create_restarts(self, sentence_pairs):
+        return self.map('create_restarts', sentence_pairs)
+
+    def create_replacements(self, fluent_sentences, candidate_pos=None, with_cue=True):
+        return self.map('create_replacements', [(sentence, candidate_pos, with_cue) for sentence in fluent_sentences])
+
+    def stats(self):
+        """ Report the start latency and the memory overhead of the workers.
+
+        Returns:
+            stats (`dict`): The memory of the parent process and, for every worker, its start latency in seconds
+            and its memory. The private memory of a worker is its overhead over the shared parent memory.
+        """
+        while len(self._start_latencies) < self.processes:
+            pid, latency = self._started.get()
+            self._start_latencies[pid] = latency
+
+        workers = {pid: dict(start_latency=latency, **process_memory(pid))
+                   for pid, latency in self._start_latencies.items()}
+
+        print("Worker pool with " + str(self.processes) + " workers")
+        for pid, worker in workers.items():
+            print(Fore.GREEN + "Worker " + str(pid) + ": started in " + "{:.3f}".format(worker['start_latency'])
+                  + " s, private memory " + str(worker.get('private_kb', 'N/A')) + " kB")
+
+        return {'parent': process_memory(os.getpid()), 'workers': workers}